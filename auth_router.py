@@ -1,5 +1,9 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Annotated, Optional
+from typing import Annotated, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -10,6 +14,7 @@ import config
 import schemas
 import models
 import db
+from utils import password_hasher
 
 # --- Compatibility Patch for passlib + bcrypt 4.x ---
 # Passlib < 1.7.5 issues with bcrypt >= 4.0
@@ -48,6 +53,73 @@ def get_user_by_email(db_session: Session, email: str) -> Optional[models.User]:
     # Renamed 'db' parameter to 'db_session' to avoid shadowing the imported 'db' module
     return db_session.query(models.User).filter(models.User.email == email).first()
 
+# --- Principal Cache ---
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    The authenticated user as routes see it: the User columns they read plus the ids of
+    the linked Student/Faculty profiles (None if absent). Not attached to any session.
+    """
+    id: int
+    email: str
+    name: Optional[str]
+    phone: Optional[str]
+    role: str
+    is_active: bool
+    student_id: Optional[int] = None
+    faculty_id: Optional[int] = None
+
+# token subject (email) -> (expires_at, Principal)
+_principals: Dict[str, Tuple[float, Principal]] = {}
+_principals_lock = threading.Lock()
+
+def load_principal(db_session: Session, email: str) -> Optional[Principal]:
+    """Loads the user and their profile ids in one query."""
+    row = db_session.query(
+        models.User.id, models.User.email, models.User.name, models.User.phone,
+        models.User.role, models.User.is_active, models.Student.id, models.Faculty.id,
+    ).outerjoin(
+        models.Student, models.Student.user_id == models.User.id
+    ).outerjoin(
+        models.Faculty, models.Faculty.user_id == models.User.id
+    ).filter(models.User.email == email).first()
+    if row is None:
+        return None
+    return Principal(
+        id=row[0], email=row[1], name=row[2], phone=row[3], role=row[4],
+        is_active=bool(row[5]), student_id=row[6], faculty_id=row[7],
+    )
+
+def get_principal(db_session: Session, email: str) -> Optional[Principal]:
+    """
+    Cached for PRINCIPAL_CACHE_TTL_SECONDS per worker, so authenticated requests skip the
+    user lookup. Edits call invalidate_principal; the TTL bounds staleness across workers.
+    """
+    now = time.monotonic()
+    cached = _principals.get(email)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    principal = load_principal(db_session, email)
+    if principal is None:
+        return None
+    with _principals_lock:
+        if len(_principals) >= config.PRINCIPAL_CACHE_MAX_ENTRIES:
+            for key in [k for k, (expires_at, _) in _principals.items() if expires_at <= now]:
+                del _principals[key]
+            # Still full: drop the oldest entries
+            while len(_principals) >= config.PRINCIPAL_CACHE_MAX_ENTRIES:
+                del _principals[next(iter(_principals))]
+        _principals[email] = (now + config.PRINCIPAL_CACHE_TTL_SECONDS, principal)
+    return principal
+
+def invalidate_principal(*emails: Optional[str]) -> None:
+    """Call after a user is edited, deactivated or has their password reset."""
+    with _principals_lock:
+        for email in emails:
+            _principals.pop(email, None)
+
 def create_db_user(db_session: Session, user: schemas.UserCreate) -> models.User:
     """CRUD: Creates a new user."""
     hashed_password = get_password_hash(user.password)
@@ -71,13 +143,26 @@ def authenticate_user(db_session: Session, email: str, password: str) -> Optiona
         return None
     return user
 
+async def authenticate_user_async(db_session: Session, email: str, password: str) -> Optional[models.User]:
+    """
+    authenticate_user for async routes: the lookup runs in a worker thread and the
+    hash check on the bounded hasher pool, so neither blocks the event loop.
+    Raises password_hasher.HasherBusy when the hasher queue is full.
+    """
+    user = await asyncio.to_thread(get_user_by_email, db_session, email)
+    if not user or not user.is_active:
+        return None
+    if not await password_hasher.run(verify_password, password, user.hashed_password):
+        return None
+    return user
+
 # --- Authentication Dependencies ---
 
 def get_current_user(
     db_session: Annotated[Session, Depends(db.get_db)], # Use db.get_db here
     token: Annotated[str, Depends(oauth2_scheme)]
-) -> models.User:
-    """Decodes the JWT token and fetches the user from the database."""
+) -> Principal:
+    """Decodes the JWT token and resolves its user from the principal cache."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -94,13 +179,13 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    # Pass db_session to the helper function
-    user = get_user_by_email(db_session, email=token_data.sub) 
+    # Cached identity; the session only opens a connection on a cache miss
+    user = get_principal(db_session, email=token_data.sub)
     if user is None:
         raise credentials_exception
     return user
 
-def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)]) -> models.User:
+def get_current_active_user(current_user: Annotated[Principal, Depends(get_current_user)]) -> Principal:
     """Dependency: Ensures the authenticated user is active. Accessible by all roles."""
     if not current_user.is_active:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
@@ -108,7 +193,7 @@ def get_current_active_user(current_user: Annotated[models.User, Depends(get_cur
 
 # --- Role-Specific Dependencies ---
 
-def get_current_active_role(current_user: models.User, required_role: str) -> models.User:
+def get_current_active_role(current_user: Principal, required_role: str) -> Principal:
     """Helper function to enforce a specific role."""
     if current_user.role != required_role:
         raise HTTPException(
@@ -117,19 +202,19 @@ def get_current_active_role(current_user: models.User, required_role: str) -> mo
         )
     return current_user
 
-def get_current_active_admin(current_user: Annotated[models.User, Depends(get_current_active_user)]) -> models.User:
+def get_current_active_admin(current_user: Annotated[Principal, Depends(get_current_active_user)]) -> Principal:
     """Dependency: Enforces 'Admin' role."""
     return get_current_active_role(current_user, "Admin")
 
-def get_current_active_seating_manager(current_user: Annotated[models.User, Depends(get_current_active_user)]) -> models.User:
+def get_current_active_seating_manager(current_user: Annotated[Principal, Depends(get_current_active_user)]) -> Principal:
     """Dependency: Enforces 'Seating Manager' role."""
     return get_current_active_role(current_user, "Seating Manager")
 
-def get_current_active_club_coordinator(current_user: Annotated[models.User, Depends(get_current_active_user)]) -> models.User:
+def get_current_active_club_coordinator(current_user: Annotated[Principal, Depends(get_current_active_user)]) -> Principal:
     """Dependency: Enforces 'Club Coordinator' role."""
     return get_current_active_role(current_user, "Club Coordinator")
 
-def get_current_active_student(current_user: Annotated[models.User, Depends(get_current_active_user)]) -> models.User:
+def get_current_active_student(current_user: Annotated[Principal, Depends(get_current_active_user)]) -> Principal:
     """Dependency: Enforces 'Student' role."""
     return get_current_active_role(current_user, "Student")
 
@@ -177,7 +262,14 @@ async def login_for_access_token(
     db_session: Annotated[Session, Depends(db.get_db)]
 ):
     """Handles user login and returns a JWT access token."""
-    user = authenticate_user(db_session, email=form_data.username, password=form_data.password)
+    try:
+        user = await authenticate_user_async(db_session, email=form_data.username, password=form_data.password)
+    except password_hasher.HasherBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress. Please retry shortly.",
+            headers={"Retry-After": str(config.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+        )
     
     if not user:
         raise HTTPException(
@@ -194,38 +286,41 @@ async def login_for_access_token(
 # --- General Protected Route (All Active Roles) ---
 
 @auth_router.get("/users/me", response_model=schemas.UserRead)
-async def read_users_me(current_user: Annotated[models.User, Depends(get_current_active_user)], db_session: Session = Depends(db.get_db)):
+async def read_users_me(current_user: Annotated[Principal, Depends(get_current_active_user)], db_session: Session = Depends(db.get_db)):
     """Returns the current user. Injects faculty_type if applicable."""
     # Create a copy or dict to avoid mutating the ORM object directly if session is active
     user_dict = schemas.UserRead.model_validate(current_user).model_dump()
     
-    if current_user.role == "Faculty":
-        # Check for linked faculty profile
-        # Use simple query to avoid relationship loading issues if not eager loaded
-        fac = db_session.query(models.Faculty).filter(models.Faculty.user_id == current_user.id).first()
-        if fac:
-            user_dict["faculty_type"] = fac.faculty_type
+    if current_user.role == "Faculty" and current_user.faculty_id:
+        faculty_type = db_session.query(models.Faculty.faculty_type).filter(models.Faculty.id == current_user.faculty_id).scalar()
+        if faculty_type:
+            user_dict["faculty_type"] = faculty_type
 
     return user_dict
 
 # --- Role-Specific Protected Routes (Demonstration) ---
 
 @auth_router.get("/admin/dashboard-access")
-async def admin_dashboard_access(current_user: Annotated[models.User, Depends(get_current_active_admin)]):
+async def admin_dashboard_access(current_user: Annotated[Principal, Depends(get_current_active_admin)]):
     """Endpoint only accessible by 'Admin' role users."""
     return {"message": f"Welcome, Admin {current_user.email}! You can now manage the academic calendar and user roles."}
 
+@auth_router.get("/admin/hasher-metrics")
+async def hasher_metrics(current_user: Annotated[Principal, Depends(get_current_active_admin)]):
+    """Admin: load on the password hasher pool (queue depth, rejections, wait and run times)."""
+    return password_hasher.metrics()
+
 @auth_router.get("/seating-manager/allocation-tool")
-async def seating_manager_tool_access(current_user: Annotated[models.User, Depends(get_current_active_seating_manager)]):
+async def seating_manager_tool_access(current_user: Annotated[Principal, Depends(get_current_active_seating_manager)]):
     """Endpoint only accessible by 'Seating Manager' role users."""
     return {"message": f"Welcome, Seating Manager {current_user.email}! You have access to the seating allocation module."}
 
 @auth_router.get("/club-coordinator/event-submission")
-async def club_coordinator_submission_access(current_user: Annotated[models.User, Depends(get_current_active_club_coordinator)]):
+async def club_coordinator_submission_access(current_user: Annotated[Principal, Depends(get_current_active_club_coordinator)]):
     """Endpoint only accessible by 'Club Coordinator' role users."""
     return {"message": f"Welcome, Club Coordinator {current_user.email}! You can submit event proposals for approval."}
 
 @auth_router.get("/student/schedule")
-async def student_schedule_access(current_user: Annotated[models.User, Depends(get_current_active_student)]):
+async def student_schedule_access(current_user: Annotated[Principal, Depends(get_current_active_student)]):
     """Endpoint only accessible by 'Student' role users."""
     return {"message": f"Welcome, Student {current_user.email}! Here is your personalized academic schedule and hall ticket status."}
@@ -0,0 +1,152 @@
+import argparse
+import ast
+import gc
+import json
+import os
+import random
+import statistics
+import time
+import tracemalloc
+
+from utils import mind_map_generator as g
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "seed_courses_automated.py")
+STAGES = ["tokenisation", "lemmatisation", "tfidf", "textrank", "word2vec", "tree"]
+
+def load_seed_syllabi():
+    """The syllabus literals of seed_courses_automated.py, read without running the seeder."""
+    with open(SEED_FILE, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    syllabi = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Dict):
+            continue
+        fields = {
+            k.value: v.value for k, v in zip(node.keys, node.values)
+            if isinstance(k, ast.Constant) and isinstance(v, ast.Constant)
+        }
+        if isinstance(fields.get("syllabus"), str):
+            syllabi[fields.get("code", f"doc{len(syllabi)}")] = fields["syllabus"]
+    return syllabi
+
+def synthetic_documents(syllabi, sizes, seed=42):
+    """Documents of roughly `size` words each, made of sentences sampled from the seed syllabi."""
+    sentences = [s.strip() for text in syllabi.values() for s in text.replace("\n", ". ").split(".") if s.strip()]
+    rng = random.Random(seed)
+    documents = {}
+    for size in sizes:
+        words, parts = 0, []
+        while words < size:
+            sentence = rng.choice(sentences)
+            parts.append(sentence)
+            words += len(sentence.split())
+        documents[f"synthetic-{size}"] = ". ".join(parts) + "."
+    return documents
+
+def _encode_and_score(processed):
+    vocab, token_ids, sentence_ids = g.encode_sentences(processed)
+    return vocab, token_ids, sentence_ids, g.tfidf_scores(token_ids, len(vocab))
+
+def run_stages(text, depth, per_document, clock):
+    """Runs the generator stage by stage; clock(stage, fn) runs fn and returns its result."""
+    tokenized = clock("tokenisation", lambda: g.tokenize_sentences(text))
+    processed = clock("lemmatisation", lambda: g.lemmatize_sentences(tokenized))
+    if not processed:
+        return None
+
+    # Vocabulary encoding is shared by TF-IDF and TextRank; it is counted under TF-IDF
+    vocab, token_ids, sentence_ids, tfidf = clock("tfidf", lambda: _encode_and_score(processed))
+    rank = clock("textrank", lambda: g.textrank_scores(g.cooccurrence_matrix(token_ids, sentence_ids, len(vocab))))
+    # Same selection as extract_key_concepts
+    top = (-(tfidf + rank) / 2).argsort(kind="stable")[:4]
+    key_concepts = [vocab[i] for i in top]
+
+    if per_document:
+        vectors = clock("word2vec", lambda: g.train_word2vec(processed).wv)
+    else:
+        vectors = clock("word2vec", lambda: g.document_vectors(processed))
+    return clock("tree", lambda: g.mind_map_to_dict(
+        g.build_tree(key_concepts, vectors, g.SentenceIndex(processed), depth)
+    ))
+
+def time_document(text, depth, repeat, per_document):
+    """Median seconds per stage over `repeat` runs."""
+    samples = {stage: [] for stage in STAGES}
+
+    def clock(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        samples[stage].append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        run_stages(text, depth, per_document, clock)
+    return {stage: statistics.median(values) for stage, values in samples.items() if values}
+
+def memory_document(text, depth, per_document):
+    """Peak traced allocation per stage in bytes, from one separate run (tracemalloc skews timings)."""
+    peaks = {}
+
+    def clock(stage, fn):
+        gc.collect()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        peaks[stage] = tracemalloc.get_traced_memory()[1] - base
+        return result
+
+    tracemalloc.start()
+    try:
+        run_stages(text, depth, per_document, clock)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def bench_mind_map_generator(sizes, repeat=3, depth=2, per_document=False, as_json=False):
+    if not g.warm_up():
+        print("CRITICAL: NLP libraries missing. Install nltk, scipy and gensim.")
+        return
+
+    syllabi = load_seed_syllabi()
+    documents = {**syllabi, **synthetic_documents(syllabi, sizes)}
+    results = []
+    for name, text in documents.items():
+        # Warm caches (corpora, BLAS) outside the measurement
+        run_stages(text, depth, per_document, lambda stage, fn: fn())
+        times = time_document(text, depth, repeat, per_document)
+        results.append({
+            "document": name,
+            "words": len(text.split()),
+            "seconds": {stage: round(t, 4) for stage, t in times.items()},
+            "total_seconds": round(sum(times.values()), 4),
+            "peak_kb": {stage: round(b / 1024, 1) for stage, b in memory_document(text, depth, per_document).items()},
+        })
+
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return results
+
+    print(f"Word2Vec stage: {'per-document training' if per_document else 'shared index if built, else per-document'}")
+    header = f"{'document':<16}{'words':>8}" + "".join(f"{stage:>14}" for stage in STAGES) + f"{'total':>10}"
+    print("\nMedian ms per stage")
+    print(header)
+    for r in results:
+        print(f"{r['document']:<16}{r['words']:>8}"
+              + "".join(f"{r['seconds'].get(stage, 0) * 1000:>14.1f}" for stage in STAGES)
+              + f"{r['total_seconds'] * 1000:>10.1f}")
+    print("\nPeak KiB allocated per stage")
+    print(header[:-10])
+    for r in results:
+        print(f"{r['document']:<16}{r['words']:>8}"
+              + "".join(f"{r['peak_kb'].get(stage, 0):>14.1f}" for stage in STAGES))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage time and memory of the mind-map generator")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 5000, 20000, 50000], help="Synthetic document sizes in words")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per document (median is reported)")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--per-document", action="store_true", help="Always train Word2Vec per document, ignoring the shared index")
+    parser.add_argument("--json", action="store_true", dest="as_json")
+    args = parser.parse_args()
+    bench_mind_map_generator(args.sizes, args.repeat, args.depth, args.per_document, args.as_json)
@@ -0,0 +1,20 @@
+import time
+
+from db import SessionLocal
+from utils import embedding_index
+
+def build_embedding_index():
+    """Trains the shared syllabus embedding index from every course and publishes it."""
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        snapshot = embedding_index.build_index(db)
+        if snapshot:
+            print(f"Published embedding snapshot {snapshot} in {time.perf_counter() - start:.1f}s")
+        else:
+            print("No syllabus text found; nothing to index.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    build_embedding_index()
@@ -0,0 +1,27 @@
+import argparse
+import json
+
+from db import SessionLocal
+import models
+from utils import mindmap_bulk
+
+def bulk_generate_mindmaps(course_ids=None, force=False):
+    """Generates missing or stale syllabus mind maps for the course catalogue."""
+    db = SessionLocal()
+    try:
+        # Shared course maps are owned by the first admin, as if generated from the UI
+        admin = db.query(models.User.id).filter(models.User.role == "Admin").order_by(models.User.id).first()
+        if not admin:
+            print("CRITICAL: No Admin user found to own the generated maps.")
+            return
+        report = mindmap_bulk.generate_for_courses(db, admin[0], course_ids=course_ids, force=force)
+        print(json.dumps(report, indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-generate course syllabus mind maps")
+    parser.add_argument("--course-id", type=int, action="append", dest="course_ids", help="Limit to a course (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Regenerate up-to-date maps too")
+    args = parser.parse_args()
+    bulk_generate_mindmaps(args.course_ids, args.force)
@@ -17,6 +17,14 @@ SECRET_KEY = os.environ.get("JWT_SECRET", "171a64956fbdf8c2f8e6af81fd8edf3012aa6
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 ACCESS_TOKEN_EXPIRE_DELTA = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+# Seconds an authenticated user's identity (role, active flag, profile ids) is reused without a DB lookup
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.environ.get("PRINCIPAL_CACHE_MAX_ENTRIES", "20000"))
+# Threads hashing/verifying passwords for async logins; caps the CPU a login storm can take
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", max(2, (os.cpu_count() or 2) // 2)))
+# Logins allowed to wait for a hasher thread; beyond this they get 503 with Retry-After
+PASSWORD_HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "64"))
+PASSWORD_HASH_RETRY_AFTER_SECONDS = int(os.environ.get("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
 
 # ------------------------------------
 # System Roles
@@ -32,3 +40,65 @@ TOKEN_URL = "/api/auth/token"
 # Communication Service URL
 # ------------------------------------
 MAIL_SERVICE_URL = os.environ.get("MAIL_SERVICE_URL", "https://mail-service-flax.vercel.app")
+
+# ------------------------------------
+# Hall Ticket Dispatch
+# ------------------------------------
+# Uploaded, dispatched and pre-rendered hall-ticket PDFs live under this directory
+HALL_TICKET_STORAGE_DIR = os.environ.get("HALL_TICKET_STORAGE_DIR", "storage/hall_tickets")
+# Max hall tickets rendered at once (size of the rendering process pool)
+DISPATCH_CONCURRENCY = int(os.environ.get("DISPATCH_CONCURRENCY", os.cpu_count() or 2))
+# Number of tickets rendered between progress updates in the dispatch tables
+DISPATCH_PROGRESS_BATCH = int(os.environ.get("DISPATCH_PROGRESS_BATCH", "200"))
+# Fraction of allocated tickets that must be pre-rendered before a release becomes visible
+PRERENDER_RELEASE_THRESHOLD = float(os.environ.get("PRERENDER_RELEASE_THRESHOLD", "0.95"))
+# A release whose pre-render rows have not changed for this long is resumed by the next release/progress call
+PRERENDER_STALL_SECONDS = int(os.environ.get("PRERENDER_STALL_SECONDS", "300"))
+# Threads extracting bulk-uploaded hall-ticket ZIPs
+UPLOAD_EXTRACT_WORKERS = int(os.environ.get("UPLOAD_EXTRACT_WORKERS", "4"))
+
+# ------------------------------------
+# Hall Ticket Verification
+# ------------------------------------
+# Max age of a worker's in-memory per-exam verification index before it is reloaded
+VERIFICATION_INDEX_TTL_SECONDS = int(os.environ.get("VERIFICATION_INDEX_TTL_SECONDS", "300"))
+# QR payloads are HMAC-signed with this key; tickets are issued unsigned while it is unset.
+# Keep it separate from JWT_SECRET: anything that verifies QRs offline has to hold it.
+QR_SIGNING_KEY = os.environ.get("QR_SIGNING_KEY")
+# Base64 32-byte Ed25519 private key signing offline manifests; scanners only get its public key.
+# Manifests are not served while it is unset. Generate with: python -c "import os,base64;print(base64.b64encode(os.urandom(32)).decode())"
+MANIFEST_SIGNING_KEY = os.environ.get("MANIFEST_SIGNING_KEY")
+# Signed tickets scan only from this long before the exam starts until this long after it ends
+QR_VALID_BEFORE_MINUTES = int(os.environ.get("QR_VALID_BEFORE_MINUTES", "180"))
+QR_VALID_AFTER_MINUTES = int(os.environ.get("QR_VALID_AFTER_MINUTES", "60"))
+# Reject unsigned (legacy) QR payloads once all issued tickets are signed
+QR_REQUIRE_SIGNATURE = os.environ.get("QR_REQUIRE_SIGNATURE", "false").lower() == "true"
+
+# ------------------------------------
+# Mind Maps
+# ------------------------------------
+# NLTK corpora (punkt, punkt_tab, stopwords, wordnet) are read from here; fill it with download_nltk_data.py at build time
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA_DIR", "nltk_data")
+# Fetch missing corpora over the network on first use instead of failing
+NLTK_AUTO_DOWNLOAD = os.environ.get("NLTK_AUTO_DOWNLOAD", "false").lower() == "true"
+# Load the NLP stack during startup on workers that serve mind-map generation
+MINDMAP_WARMUP_ON_STARTUP = os.environ.get("MINDMAP_WARMUP_ON_STARTUP", "false").lower() == "true"
+# Shared syllabus embedding index (build with build_embedding_index.py); per-document Word2Vec is used until it exists
+EMBEDDING_INDEX_DIR = os.environ.get("EMBEDDING_INDEX_DIR", "storage/embeddings")
+EMBEDDING_VECTOR_SIZE = int(os.environ.get("EMBEDDING_VECTOR_SIZE", "100"))
+EMBEDDING_EPOCHS = int(os.environ.get("EMBEDDING_EPOCHS", "20"))
+# Processes generating mind maps (PDF extraction + NLP); each loads the NLP stack once
+MINDMAP_WORKERS = int(os.environ.get("MINDMAP_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# PDF text extraction caps: pages read and characters kept per document
+PDF_MAX_PAGES = int(os.environ.get("PDF_MAX_PAGES", "150"))
+PDF_MAX_CHARS = int(os.environ.get("PDF_MAX_CHARS", "500000"))
+# Pages per chunk when a PDF is extracted in parallel across the mind-map workers
+PDF_PAGES_PER_CHUNK = int(os.environ.get("PDF_PAGES_PER_CHUNK", "16"))
+# Preprocessed syllabus tokens, one file per text hash, so repeat runs skip tokenisation; empty disables
+PREPROCESS_CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", "storage/preprocessed")
+
+# ------------------------------------
+# Concept Search
+# ------------------------------------
+# Max age of a worker's in-memory course/mind-map search index before it is rebuilt
+CONCEPT_SEARCH_TTL_SECONDS = int(os.environ.get("CONCEPT_SEARCH_TTL_SECONDS", "600"))
@@ -0,0 +1,13 @@
+import nltk
+
+import config
+from utils.mind_map_generator import NLTK_RESOURCES
+
+def download_nltk_data():
+    """Fetches the corpora the mind-map generator needs into NLTK_DATA_DIR (run at build time)."""
+    for name in NLTK_RESOURCES:
+        ok = nltk.download(name, download_dir=config.NLTK_DATA_DIR, quiet=True)
+        print(f"{'Downloaded' if ok else 'FAILED'}: {name} -> {config.NLTK_DATA_DIR}")
+
+if __name__ == "__main__":
+    download_nltk_data()
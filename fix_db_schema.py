@@ -47,5 +47,36 @@ def fix_schema():
         else:
             logger.info("'faculty_id' column already exists in 'exams' table.")
 
+        # Check and add 'result' (bulk-generation report) to 'mindmap_jobs' table
+        if inspector.has_table("mindmap_jobs"):
+            job_columns = [col['name'] for col in inspector.get_columns("mindmap_jobs")]
+            if "result" not in job_columns:
+                logger.info("Adding 'result' column to 'mindmap_jobs' table...")
+                try:
+                    connection.execute(text("ALTER TABLE mindmap_jobs ADD COLUMN result JSON NULL"))
+                    connection.commit()
+                    logger.info("'result' column added successfully.")
+                except Exception as e:
+                    logger.error(f"Error adding 'result' column: {e}")
+                    connection.rollback()
+            else:
+                logger.info("'result' column already exists in 'mindmap_jobs' table.")
+
+        # Check and add 'content_hash' (cache key of the map's source text) to 'mindmaps' table
+        if inspector.has_table("mindmaps"):
+            map_columns = [col['name'] for col in inspector.get_columns("mindmaps")]
+            if "content_hash" not in map_columns:
+                logger.info("Adding 'content_hash' column to 'mindmaps' table...")
+                try:
+                    connection.execute(text("ALTER TABLE mindmaps ADD COLUMN content_hash VARCHAR(64) NULL"))
+                    connection.execute(text("CREATE INDEX ix_mindmaps_content_hash ON mindmaps (content_hash)"))
+                    connection.commit()
+                    logger.info("'content_hash' column added successfully.")
+                except Exception as e:
+                    logger.error(f"Error adding 'content_hash' column: {e}")
+                    connection.rollback()
+            else:
+                logger.info("'content_hash' column already exists in 'mindmaps' table.")
+
 if __name__ == "__main__":
     fix_schema()
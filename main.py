@@ -5,12 +5,13 @@ from fastapi.responses import FileResponse
 from sqlalchemy.exc import SQLAlchemyError
 import logging
 import os
-from routers import students, exams, notifications, admin, courses, rooms, allocations, clubs, hall_ticket, calendar, mindmaps, programs, faculty, timetable
+from routers import students, exams, notifications, admin, courses, rooms, allocations, clubs, hall_ticket, calendar, mindmaps, programs, faculty, timetable, search
 
 # FIX: Changed relative imports (e.g., from .db import ...) to direct imports
 # assuming all files (db.py, auth_router.py, etc.) are in the same directory.
 import db
 import auth_router
+import config
 
 # Configure logging
 logging.basicConfig()
@@ -40,6 +41,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read the pagination cursor of /hall-tickets/all
+    expose_headers=["X-Next-Cursor"],
     max_age=3600, # Cache preflight requests for 1 hour
 )
 
@@ -62,6 +65,13 @@ def on_startup():
     except Exception as e:
         print(f"An unexpected error occurred during startup: {e}")
 
+    if config.MINDMAP_WARMUP_ON_STARTUP:
+        from utils import mind_map_generator
+        if mind_map_generator.warm_up():
+            print("Mind-map NLP stack loaded.")
+        else:
+            print("Mind-map warm-up skipped: NLP libraries not installed.")
+
 # --- Include Routers with /api prefix ---
 app.include_router(auth_router.auth_router, prefix="/api")
 app.include_router(students.router, prefix="/api")
@@ -78,6 +88,7 @@ app.include_router(mindmaps.router, prefix="/api")
 app.include_router(programs.router, prefix="/api")
 app.include_router(faculty.router, prefix="/api")
 app.include_router(timetable.router, prefix="/api")
+app.include_router(search.router, prefix="/api")
 
 @app.get("/", tags=["Root"])
 def read_root():
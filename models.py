@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from db import Base
@@ -215,6 +215,71 @@ class SeatAllocation(Base):
     room = relationship("Room", back_populates="seat_allocations")
     seat = relationship("RoomSeat", back_populates="seat_allocations")
 
+class ExamAttendance(Base):
+    __tablename__ = "exam_attendance"
+    __table_args__ = (
+        UniqueConstraint("exam_id", "student_id", name="uq_exam_attendance_exam_student"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    student_id = Column(Integer, ForeignKey("students.id"), nullable=False)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=True)
+    scanned_at = Column(DateTime, nullable=False)
+    scanner_id = Column(String(100), nullable=True)
+    recorded_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    exam = relationship("Exams")
+    student = relationship("Student")
+    room = relationship("Room")
+
+class AllocationChange(Base):
+    __tablename__ = "allocation_changes"
+    __table_args__ = (
+        Index("ix_allocation_changes_exam_version", "exam_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True) # Doubles as the exam manifest version
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    roll_number = Column(String(50), nullable=False)
+    op = Column(String(10), nullable=False) # UPSERT or DELETE
+    room_id = Column(Integer, nullable=True)
+    room_name = Column(String(100), nullable=True)
+    seat_label = Column(String(20), nullable=True)
+    student_name = Column(String(150), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DispatchBatch(Base):
+    __tablename__ = "dispatch_batches"
+
+    id = Column(String(64), primary_key=True) # e.g. BATCH_20250101_1A2B3C4D
+    kind = Column(String(20), nullable=False, default="DISPATCH") # DISPATCH, UPLOAD or PRERENDER
+    app_id = Column(String(100), nullable=True)
+    exam_id = Column(Integer, nullable=True, index=True)
+    total_requested = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    items = relationship("DispatchItem", back_populates="batch")
+
+class DispatchItem(Base):
+    __tablename__ = "dispatch_items"
+    __table_args__ = (
+        Index("ix_dispatch_items_batch_status", "batch_id", "status"),
+        Index("ix_dispatch_items_batch_roll", "batch_id", "roll_number"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(String(64), ForeignKey("dispatch_batches.id"), nullable=False)
+    roll_number = Column(String(50), nullable=False)
+    branch = Column(String(100), nullable=True)
+    status = Column(String(20), nullable=False, default="PENDING") # PENDING, SUCCESS, FAILED
+    error = Column(Text, nullable=True)
+    payload = Column(JSON, nullable=True) # Original assignment, kept for retries
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    batch = relationship("DispatchBatch", back_populates="items")
+
 class Club(Base):
     __tablename__ = "clubs"
 
@@ -335,10 +400,50 @@ class MindMap(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String(255), index=True)
     data = Column(JSON)
+    content_hash = Column(String(64), index=True, nullable=True) # MindMapCache key the map was generated from
     created_at = Column(DateTime, default=func.now())
 
     user = relationship("User", back_populates="mindmaps")
 
+class MindMapTreeNode(Base):
+    __tablename__ = "mindmap_nodes"
+    __table_args__ = (
+        UniqueConstraint("map_id", "path", name="uq_mindmap_nodes_map_path"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    map_id = Column(Integer, ForeignKey("mindmaps.id"), nullable=False)
+    path = Column(String(255), nullable=False) # Child indices from the root, e.g. "0.2"; root is ""
+    parent_path = Column(String(255), nullable=True)
+    depth = Column(Integer, nullable=False)
+    name = Column(String(255), nullable=False)
+    link = Column(String(500), nullable=True)
+    youtube_link = Column(String(500), nullable=True)
+    child_count = Column(Integer, default=0)
+
+class MindMapCache(Base):
+    __tablename__ = "mindmap_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False) # sha256 of normalised text + generator params
+    params = Column(String(100), nullable=False)
+    data = Column(JSON, nullable=False)
+    mindmap_id = Column(Integer, ForeignKey("mindmaps.id"), nullable=True) # Shared MindMap row for this content
+    created_at = Column(DateTime, default=func.now())
+
+class MindMapJob(Base):
+    __tablename__ = "mindmap_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    title = Column(String(255))
+    status = Column(String(20), default="pending") # pending, running, completed, failed
+    mindmap_id = Column(Integer, ForeignKey("mindmaps.id"), nullable=True)
+    result = Column(JSON, nullable=True) # Report of a bulk-generation job
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
 class Faculty(Base):
     __tablename__ = "faculty"
     
@@ -18,7 +18,7 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 
 @router.get("/dashboard/stats")
 def get_dashboard_stats(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get admin dashboard statistics"""
@@ -46,7 +46,7 @@ def get_dashboard_stats(
 
 @router.get("/exams/upcoming")
 def get_upcoming_exams(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get upcoming exams for admin dashboard"""
@@ -66,7 +66,7 @@ def get_upcoming_exams(
 
 @router.get("/audit-logs/recent")
 def get_recent_activities(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get recent audit logs/activities"""
@@ -79,7 +79,7 @@ def get_recent_activities(
 
 @router.get("/events/pending")
 def get_pending_events(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get events pending approval"""
@@ -101,7 +101,7 @@ def get_pending_events(
 
 @router.get("/events")
 def get_all_events(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get all events (history) for admin"""
@@ -131,7 +131,7 @@ class EventStatusUpdate(BaseModel):
 @router.get("/events/{event_id}")
 def get_event_details(
     event_id: int,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get event details by ID"""
@@ -172,7 +172,7 @@ def get_event_details(
 def update_event_status(
     event_id: int,
     status_data: EventStatusUpdate,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Update event status (Approved/Rejected)"""
@@ -204,7 +204,7 @@ def update_event_status(
 
 @router.get("/calendar/events")
 def get_all_calendar_events(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get all events and exams for the admin calendar"""
@@ -252,7 +252,7 @@ class AssignCourseRequest(BaseModel):
 def assign_course_to_faculty(
     req: AssignCourseRequest,
     background_tasks: BackgroundTasks,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Assign a course to a teaching faculty member."""
@@ -330,7 +330,7 @@ def assign_course_to_faculty(
 @router.post("/faculty/unassign-course")
 def unassign_course_from_faculty(
     req: AssignCourseRequest,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)], # TODO: Admin check
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)], # TODO: Admin check
     db: Session = Depends(get_db)
 ):
     """Remove a course assignment from a faculty member."""
@@ -350,7 +350,7 @@ def unassign_course_from_faculty(
 def reset_student_password(
     student_id: int,
     req: dict, # Expecting {"password": "new_password"}
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_admin)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_admin)],
     db: Session = Depends(get_db)
 ):
     student = db.query(models.Student).filter(models.Student.id == student_id).first()
@@ -367,12 +367,13 @@ def reset_student_password(
     
     user.hashed_password = auth_router.get_password_hash(new_password)
     db.commit()
+    auth_router.invalidate_principal(user.email)
     
     return {"message": "Password reset successfully"}
 
 @router.get("/reports/academic-risks")
 def get_academic_risk_report(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """
@@ -9,6 +9,7 @@ import schemas
 from datetime import timedelta
 import auth_router
 from utils.seating_algorithm import allocate_seating, generate_adjacency_matrix
+from utils import verification_index, offline_manifest, ticket_dispatcher, room_packs
 
 router = APIRouter(prefix="/allocations", tags=["allocations"])
 
@@ -24,6 +25,19 @@ class AutoAllocationRequest(BaseModel):
     room_id: Optional[int] = None
     exam_type: str = "SEMESTER" # MID or SEMESTER
 
+def _after_allocation_change(db: Session, exam_id: int, student_ids):
+    """
+    Keeps the verification index, the offline-manifest change log, any
+    pre-rendered tickets and stored room packs in step with committed allocations.
+    """
+    student_ids = list(student_ids)
+    offline_manifest.record_allocation_changes(db, exam_id, student_ids)
+    verification_index.refresh_if_loaded(db, exam_id)
+    if student_ids:
+        rolls = [r for (r,) in db.query(models.Student.roll_number).filter(models.Student.id.in_(student_ids)).all()]
+        ticket_dispatcher.discard_prerendered(exam_id, rolls)
+    room_packs.discard(exam_id)
+
 @router.get("/", response_model=List[schemas.SeatAllocationRead])
 def get_allocations(
     exam_id: int, 
@@ -53,10 +67,12 @@ def save_allocation(
     
     if existing:
         # Update
+        previous_student_id = existing.student_id
         existing.student_id = req.student_id
         existing.manual_override = req.manual_override
         db.commit()
         db.refresh(existing)
+        _after_allocation_change(db, req.exam_id, [previous_student_id, req.student_id])
         return existing
     
     # Check if student is already seated elsewhere for this exam
@@ -72,6 +88,7 @@ def save_allocation(
         student_existing.manual_override = req.manual_override
         db.commit()
         db.refresh(student_existing)
+        _after_allocation_change(db, req.exam_id, [req.student_id])
         return student_existing
 
     # Create new
@@ -85,6 +102,7 @@ def save_allocation(
     db.add(new_alloc)
     db.commit()
     db.refresh(new_alloc)
+    _after_allocation_change(db, req.exam_id, [req.student_id])
     return new_alloc
 
 @router.post("/auto")
@@ -123,6 +141,11 @@ def auto_allocate(
     # BUT keep Manual overrides.
     
     # Clear previous AUTO allocations for this exam
+    # (remember who was seated so offline manifests can drop or move them)
+    affected_student_ids = {sid for (sid,) in db.query(models.SeatAllocation.student_id).filter(
+        models.SeatAllocation.exam_id == req.exam_id,
+        models.SeatAllocation.manual_override == False
+    ).all()}
     db.query(models.SeatAllocation).filter(
         models.SeatAllocation.exam_id == req.exam_id,
         models.SeatAllocation.manual_override == False
@@ -232,6 +255,7 @@ def auto_allocate(
                     manual_override=False
                 )
                 db.add(rec)
+                affected_student_ids.add(rec.student_id)
                 total_allocated += 1
             
             # Advance index by how many were successfully allocated? 
@@ -267,6 +291,7 @@ def auto_allocate(
             # Proceed.
 
     db.commit()
+    _after_allocation_change(db, req.exam_id, affected_student_ids)
     
     return {
         "status": "SUCCESS", 
@@ -281,7 +306,7 @@ def auto_allocate(
 
 @router.get("/student/me")
 def get_my_separations(
-    current_user: models.User = Depends(auth_router.get_current_active_user),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Get all seat allocations for the current student."""
@@ -329,7 +354,7 @@ class InvigilationRequest(BaseModel):
 @router.post("/invigilation")
 def assign_invigilation(
     req: InvigilationRequest,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Assign invigilation duty to a faculty member (Teaching or Non-Teaching)."""
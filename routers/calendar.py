@@ -11,7 +11,7 @@ router = APIRouter(prefix="/calendar", tags=["Calendar"])
 @router.get("/student", response_model=List[dict])
 def get_student_calendar(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user)
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
 ):
     """
     Get aggregated calendar events for a student:
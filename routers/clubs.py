@@ -4,7 +4,7 @@ from typing import List
 from db import get_db
 from models import User, Club, ClubEvent, Notification, ClubCoordinator
 from schemas import ClubEventCreate, ClubEventRead, UserRead
-from auth_router import get_current_user
+from auth_router import Principal, get_current_user
 import json
 import requests
 import config
@@ -14,7 +14,7 @@ router = APIRouter()
 @router.get("/clubs/my-club")
 def get_my_club(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Precise lookup using coordinator_id
     club = db.query(Club).filter(Club.coordinator_id == current_user.id).first()
@@ -38,7 +38,7 @@ def get_my_club(
 @router.get("/clubs/coordinator/profile")
 def get_coordinator_profile(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     profile = db.query(ClubCoordinator).filter(ClubCoordinator.user_id == current_user.id).first()
     if not profile:
@@ -54,7 +54,7 @@ def get_coordinator_profile(
 def create_event_proposal(
     event_data: ClubEventCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # 1. Resolve Club ID (Assumed from context or passed, but better to infer from user)
     # Re-using the logic to find the club
@@ -121,7 +121,7 @@ def create_event_proposal(
 @router.get("/clubs/events", response_model=List[ClubEventRead])
 def get_club_events(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Get events for the user's club
     club = db.query(Club).filter(Club.faculty_coordinator == current_user.name).first()
@@ -137,7 +137,7 @@ def get_club_events(
 def register_for_event(
     event_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Register for an event."""
     from models import EventRegistration, Student
@@ -176,7 +176,7 @@ def update_event(
     notify: bool = False,
     update_type: str = "RESCHEDULED", # RESCHEDULED or CANCELLED
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Update event details (Rescheduling, Venue Change, etc.)
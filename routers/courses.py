@@ -11,6 +11,7 @@ import models
 import schemas
 import auth_router
 import config
+from utils import concept_search, mindmap_jobs
 
 router = APIRouter(prefix="/courses", tags=["courses"])
 
@@ -75,6 +76,9 @@ def create_course(course_in: schemas.CourseCreate, background_tasks: BackgroundT
             print(f"Course creation notification error: {e}")
 
     background_tasks.add_task(notify_students_of_new_course, course)
+    if course.syllabus_text:
+        background_tasks.add_task(mindmap_jobs.update_embedding_index, [course.syllabus_text])
+    background_tasks.add_task(concept_search.update_courses_safely, [course.id])
 
     return course
 
@@ -132,7 +136,7 @@ def get_course(course_id: int, db_session: Session = Depends(get_db)):
     }
 
 @router.put("/{course_id}", response_model=schemas.CourseRead)
-def update_course(course_id: int, course_update: schemas.CourseUpdate, db_session: Session = Depends(get_db)):
+def update_course(course_id: int, course_update: schemas.CourseUpdate, background_tasks: BackgroundTasks, db_session: Session = Depends(get_db)):
     course = db_session.query(models.Course).options(
         joinedload(models.Course.instructor).joinedload(models.Faculty.user),
         joinedload(models.Course.assignments).joinedload(models.FacultyCourseAssignment.faculty).joinedload(models.Faculty.user)
@@ -159,13 +163,18 @@ def update_course(course_id: int, course_update: schemas.CourseUpdate, db_sessio
     if up.instructor_id is not None:
         # Check instructor?
         course.instructor_id = up.instructor_id
-    if up.short_description is not None:
-        course.description = up.short_description # Map short_description to description
+    if up.description is not None:
+        course.description = up.description
     if up.is_active is not None:
         course.is_active = up.is_active
+    if up.syllabus_text is not None and up.syllabus_text != course.syllabus_text:
+        course.syllabus_text = up.syllabus_text
+        # Teach the shared embedding index the edited syllabus's vocabulary
+        background_tasks.add_task(mindmap_jobs.update_embedding_index, [up.syllabus_text])
 
     db_session.commit()
     db_session.refresh(course)
+    background_tasks.add_task(concept_search.update_courses_safely, [course.id])
 
     # Return adapted
     return {
@@ -181,17 +190,18 @@ def update_course(course_id: int, course_update: schemas.CourseUpdate, db_sessio
         "description": course.description,
         "instructor_id": course.instructor_id,
         "instructor_name": course.instructor_name,
-        "syllabus_file_id": course.syllabus_file_id,
+        "syllabus_file_id": getattr(course, 'syllabus_file_id', None),
         "mindmap_id": getattr(course, 'mindmap_id', None),
     }
 
 @router.delete("/{course_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_course(course_id: int, db_session: Session = Depends(get_db)):
+def delete_course(course_id: int, background_tasks: BackgroundTasks, db_session: Session = Depends(get_db)):
     course = db_session.query(models.Course).filter(models.Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
     db_session.delete(course)
     db_session.commit()
+    background_tasks.add_task(concept_search.update_courses_safely, [course_id])
     return
 
 # --- Syllabus Upload ---
@@ -200,7 +210,7 @@ SYLLABUS_DIR = os.path.join("/tmp", "storage", "syllabus")
 os.makedirs(SYLLABUS_DIR, exist_ok=True)
 
 @router.post("/{course_id}/syllabus", response_model=schemas.CourseRead)
-def upload_syllabus(course_id: int, file: UploadFile = FastAPIFile(...), db_session: Session = Depends(get_db), current_user: models.User = Depends(auth_router.get_current_active_user)):
+def upload_syllabus(course_id: int, file: UploadFile = FastAPIFile(...), db_session: Session = Depends(get_db), current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)):
     course = db_session.query(models.Course).filter(models.Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
@@ -328,18 +338,17 @@ def enroll_student(course_id: int, payload: schemas.CourseEnrollmentCreate, back
 
 @router.get("/student/me", response_model=List[schemas.CourseRead])
 def get_student_enrollments(
-    current_user: models.User = Depends(auth_router.get_current_active_user),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user),
     db_session: Session = Depends(get_db)
 ):
     try:
         # Find student profile for this user
-        student = db_session.query(models.Student).filter(models.Student.user_id == current_user.id).first()
-        if not student:
+        if not current_user.student_id:
             return [] 
         
         # Query enrollments
         enrollments = db_session.query(models.CourseEnrollment).filter(
-            models.CourseEnrollment.student_id == student.id,
+            models.CourseEnrollment.student_id == current_user.student_id,
             models.CourseEnrollment.enrollment_status == "active"
         ).all()
         
@@ -388,7 +397,7 @@ IMPORT_DIR = os.path.join("/tmp", "storage", "imports")
 os.makedirs(IMPORT_DIR, exist_ok=True)
 
 @router.post("/bulk-import", status_code=status.HTTP_201_CREATED)
-def bulk_import_courses(file: UploadFile = FastAPIFile(...), db_session: Session = Depends(get_db), current_user: models.User = Depends(auth_router.get_current_active_user)):
+def bulk_import_courses(file: UploadFile = FastAPIFile(...), db_session: Session = Depends(get_db), current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)):
     # Save uploaded file
     storage_filename = f"courses_import_{current_user.id}_{file.filename}"
     storage_path = os.path.join(IMPORT_DIR, storage_filename)
@@ -421,6 +430,6 @@ def bulk_import_courses(file: UploadFile = FastAPIFile(...), db_session: Session
     return {"jobId": job.id}
 
 @router.get("/import-jobs", response_model=List[schemas.CourseImportJobRead])
-def list_import_jobs(db_session: Session = Depends(get_db), current_user: models.User = Depends(auth_router.get_current_active_admin)):
+def list_import_jobs(db_session: Session = Depends(get_db), current_user: auth_router.Principal = Depends(auth_router.get_current_active_admin)):
     jobs = db_session.query(models.CourseImportJob).order_by(models.CourseImportJob.id.desc()).all()
     return jobs
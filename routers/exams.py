@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session, joinedload
 from typing import List, Annotated
 from datetime import datetime
 from db import SessionLocal
+from utils import dispatch_store, ticket_dispatcher
 
 router = APIRouter(prefix="/exams", tags=["exams"])
 
@@ -145,28 +146,118 @@ def get_exam_students(exam_id: int, db: Session = Depends(get_db)):
 @router.post("/{exam_id}/release-hall-tickets")
 def release_hall_tickets(
     exam_id: int,
+    background_tasks: BackgroundTasks,
+    rerender: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user) # Assuming admin check later
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user) # Assuming admin check later
 ):
+    """
+    Starts the release: every allocated ticket is pre-rendered in the background and the
+    exam becomes HALL_TICKETS_RELEASED once PRERENDER_RELEASE_THRESHOLD of them are on disk.
+    Calling it again while the release is stalled resumes the PENDING and FAILED renders.
+    An exam already released stays released; pass ?rerender=true to render its tickets again.
+    """
     exam = db.query(models.Exams).filter(models.Exams.id == exam_id).first()
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
+
+    released = exam.status == "HALL_TICKETS_RELEASED"
+    if released and not rerender:
+        return {"message": "Hall tickets are already released", "exam_status": exam.status}
+
+    if exam.status == "HALL_TICKETS_RENDERING":
+        batch = ticket_dispatcher.latest_prerender_batch(db, exam_id)
+        if batch:
+            if not ticket_dispatcher.claim_stalled_prerender(db, batch.id):
+                return {"message": "Hall ticket release already in progress", "batch_id": batch.id, "count": batch.total_requested}
+            background_tasks.add_task(ticket_dispatcher.run_prerender, exam_id, batch.id, retry_failed=True)
+            return {"message": "Hall ticket release resumed", "batch_id": batch.id, "count": batch.total_requested}
     
     # Check if allocations exist
     alloc_count = db.query(models.SeatAllocation).filter(models.SeatAllocation.exam_id == exam_id).count()
     if alloc_count == 0:
         raise HTTPException(status_code=400, detail="Cannot release hall tickets. No seats allocated yet.")
 
-    exam.status = "HALL_TICKETS_RELEASED"
-    db.commit()
-    return {"message": "Hall tickets released successfully", "count": alloc_count}
+    batch_id, count = ticket_dispatcher.create_prerender_batch(db, exam_id)
+    if not released:
+        # A re-render of a released exam keeps serving tickets (stored or on demand) meanwhile
+        exam.status = "HALL_TICKETS_RENDERING"
+        db.commit()
+
+    ticket_dispatcher.claim_prerender(batch_id)
+    background_tasks.add_task(ticket_dispatcher.run_prerender, exam_id, batch_id)
+    message = "Hall ticket re-render started" if released else "Hall ticket release started"
+    return {"message": message, "batch_id": batch_id, "count": count}
+
+@router.get("/{exam_id}/release-progress")
+def get_release_progress(
+    exam_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
+):
+    """
+    Progress of the latest release-time pre-render for an exam.
+    A stalled release (see PRERENDER_STALL_SECONDS) is resumed in the background.
+    """
+    exam_status = db.query(models.Exams.status).filter(models.Exams.id == exam_id).first()
+    if not exam_status:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    batch = ticket_dispatcher.latest_prerender_batch(db, exam_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Hall tickets have not been released for this exam")
+
+    resumed = exam_status[0] == "HALL_TICKETS_RENDERING" and ticket_dispatcher.claim_stalled_prerender(db, batch.id)
+    if resumed:
+        background_tasks.add_task(ticket_dispatcher.run_prerender, exam_id, batch.id, retry_failed=True)
+
+    summary = dispatch_store.get_summary(db, batch)
+    total = summary["total_requested"] or 0
+    return {
+        "exam_id": exam_id,
+        "exam_status": exam_status[0],
+        "batch_id": batch.id,
+        **summary,
+        "percent_complete": round(100.0 * summary["success_count"] / total, 1) if total else 100.0,
+        "release_threshold": config.PRERENDER_RELEASE_THRESHOLD,
+        "resumed": resumed,
+    }
+
+@router.post("/{exam_id}/force-release-hall-tickets")
+def force_release_hall_tickets(
+    exam_id: int,
+    db: Session = Depends(get_db),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
+):
+    """
+    Admin override for a release stuck below PRERENDER_RELEASE_THRESHOLD: the exam becomes
+    HALL_TICKETS_RELEASED now and tickets missing from storage are rendered on download.
+    """
+    if current_user.role != "Admin":
+        raise HTTPException(status_code=403, detail="Only admins can force a hall ticket release")
+
+    exam = db.query(models.Exams).filter(models.Exams.id == exam_id).first()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    if exam.status != "HALL_TICKETS_RENDERING":
+        raise HTTPException(status_code=400, detail=f"Exam is not awaiting a hall ticket release (status: {exam.status})")
+
+    batch = ticket_dispatcher.latest_prerender_batch(db, exam_id)
+    counts = dispatch_store.get_status_counts(db, batch.id) if batch else {}
+    ticket_dispatcher.mark_released(db, exam)
+    return {
+        "message": "Hall tickets released; missing tickets will be rendered on download",
+        "rendered_count": counts.get(dispatch_store.STATUS_SUCCESS, 0),
+        "missing_count": counts.get(dispatch_store.STATUS_PENDING, 0) + counts.get(dispatch_store.STATUS_FAILED, 0),
+    }
 
 @router.post("/{exam_id}/release-results")
 def release_results(
     exam_id: int,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user)
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
 ):
     """Marks an exam as results released and notifies students."""
     exam = db.query(models.Exams).filter(models.Exams.id == exam_id).first()
@@ -200,15 +291,14 @@ def release_results(
 
 @router.get("/student/me")
 def get_student_upcoming_exams(
-    current_user: models.User = Depends(auth_router.get_current_active_user),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    # Find student profile
-    student = db.query(models.Student).filter(models.Student.user_id == current_user.id).first()
-    if not student:
+    # Student profile id comes with the cached principal
+    if not current_user.student_id:
         raise HTTPException(status_code=404, detail="Student profile not found")
 
-    enrolled_courses = db.query(models.CourseEnrollment.course_id).filter(models.CourseEnrollment.student_id == student.id).all()
+    enrolled_courses = db.query(models.CourseEnrollment.course_id).filter(models.CourseEnrollment.student_id == current_user.student_id).all()
     course_ids = [ec.course_id for ec in enrolled_courses]
     
     exams = db.query(models.Exams).options(joinedload(models.Exams.course)).filter(models.Exams.course_id.in_(course_ids)).all()
@@ -218,7 +308,7 @@ def get_student_upcoming_exams(
         # Check for seat allocation
         allocation = db.query(models.SeatAllocation).options(joinedload(models.SeatAllocation.room)).filter(
             models.SeatAllocation.exam_id == exam.id,
-            models.SeatAllocation.student_id == student.id
+            models.SeatAllocation.student_id == current_user.student_id
         ).first()
 
         room_name = allocation.room.name if allocation and allocation.room else None
@@ -8,7 +8,7 @@ from db import get_db
 router = APIRouter(prefix="/faculty", tags=["faculty"])
 
 def get_current_faculty(
-    current_user: models.User = Depends(auth_router.get_current_active_user),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """Dependency to check if user is a faculty member"""
@@ -25,7 +25,7 @@ def get_current_faculty(
 
 @router.get("/me", response_model=schemas.FacultyRead)
 def get_my_profile(
-    current_user: models.User = Depends(auth_router.get_current_active_user),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user),
     db: Session = Depends(get_db)
 ):
     # Explicitly load user relationship to avoid Pydantic serialization issues
@@ -1,264 +1,265 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, BackgroundTasks, File, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Response, BackgroundTasks, File, UploadFile, Query
+from fastapi.responses import StreamingResponse, FileResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session, joinedload
-from typing import Annotated, List, Dict, Any
+from typing import Annotated, List, Dict, Any, Callable, Optional
 from pydantic import BaseModel, Field
-import uuid
 import os
+import asyncio
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import re
 
-from db import get_db
+from db import get_db, SessionLocal
+import config
 import models
 import auth_router
-from utils.qr_utils import generate_qr_image_and_payload
+from utils import dispatch_store, ticket_dispatcher
+from utils.qr_utils import generate_qr_image_and_payload, make_ticket_token, validity_window, parse_qr_payload, check_signed_payload
+from utils import verification_index, offline_manifest, room_packs
+from utils import pdf_utils
 from utils.pdf_utils import generate_hall_ticket_buffer
 
-STORAGE_BASE = Path("storage/hall_tickets")
+STORAGE_BASE = Path(config.HALL_TICKET_STORAGE_DIR)
 STORAGE_BASE.mkdir(parents=True, exist_ok=True)
 
-router = APIRouter(prefix="/hall-tickets", tags=["hall-tickets"])
-
-
-# In-memory storage for reports (In production, move this to Firestore/DB)
-DISPATCH_REPORTS = {}
+# Bulk ZIP uploads are copied and extracted in 1 MB chunks by this pool
+UPLOAD_COPY_CHUNK = 1024 * 1024
+_extract_pool = ThreadPoolExecutor(max_workers=max(1, config.UPLOAD_EXTRACT_WORKERS), thread_name_prefix="ticket-extract")
 
-async def generate_and_save_ticket_task(student_data: dict, app_id: str, batch_id: str, is_retry: bool = False):
-    """
-    Attempts to generate a hall ticket. If it fails, logs the reason.
-    If it's a retry, it updates the existing record instead of creating a new one.
-    """
-    report = DISPATCH_REPORTS.get(batch_id)
-    if not report: return
-
-    student_id = student_data.get('student_id', 'UNKNOWN')
-    roll_no = student_data.get('roll', 'N/A')
-    branch = student_data.get('branch', 'General')
-
-    try:
-        # 1. Validation Check
-        required_fields = ['student_id', 'roll', 'seat_id', 'room_id', 'exam_id']
-        missing = [f for f in required_fields if not student_data.get(f)]
-        if missing:
-            raise ValueError(f"Data Missing: {', '.join(missing)}")
+router = APIRouter(prefix="/hall-tickets", tags=["hall-tickets"])
 
-        # 2. Generate QR Code (Internally)
-        try:
-            unique_token = f"TOKEN_{student_id}_{uuid.uuid4().hex[:4]}"
-            
-            # Use the internal utility function directly
-            qr_base64, qr_payload = generate_qr_image_and_payload(
-                student_id=str(student_id),
-                roll_number=str(roll_no),
-                seat_id=str(student_data['seat_id']),
-                exam_id=str(student_data['exam_id']),
-                allocated_room=str(student_data['room_id']), 
-                unique_token=unique_token
-            )
-        except Exception as e:
-            raise Exception(f"Internal QR Generation Failed: {str(e)}")
-
-        # 3. Simulate PDF Storage
-        target_dir = STORAGE_BASE / app_id / "users" / str(student_id) / "hall_tickets"
-        target_dir.mkdir(parents=True, exist_ok=True)
-        with open(target_dir / "hall_ticket.pdf", "w") as f:
-            f.write(f"Hall Ticket Data | QR Payload: {qr_payload}")
-
-        # 4. Update Report
-        status_entry = {"roll": roll_no, "branch": branch, "status": "SUCCESS", "error": None}
-        
-        if is_retry:
-            # Replace the old failed entry
-            report["details"] = [d for d in report["details"] if d["roll"] != roll_no]
-            report["summary"]["failure_count"] -= 1
-        
-        report["details"].append(status_entry)
-        report["summary"]["success_count"] += 1
 
-    except Exception as e:
-        error_msg = str(e)
-        if not is_retry:
-            report["details"].append({"roll": roll_no, "branch": branch, "status": "FAILED", "error": error_msg})
-            report["summary"]["failure_count"] += 1
-        else:
-            # Update the error message for the retry attempt
-            for d in report["details"]:
-                if d["roll"] == roll_no:
-                    d["error"] = f"Retry Failed: {error_msg}"
-        
-        # print(f"BATCH ERROR [{batch_id}]: Student {roll_no} -> {error_msg}")
+def dispatch_ticket_path(app_id: str) -> Callable[[Dict[str, Any]], Path]:
+    """Storage location of a dispatched ticket: <app_id>/users/<student_id>/hall_tickets/hall_ticket.pdf"""
+    def target_for(student_data: Dict[str, Any]) -> Path:
+        return STORAGE_BASE / app_id / "users" / str(student_data['student_id']) / "hall_tickets" / "hall_ticket.pdf"
+    return target_for
 
 # --- DISPATCH ENDPOINTS ---
 
 @router.post("/dispatch/finalize")
-async def finalize_and_dispatch(
+def finalize_and_dispatch(
     app_id: str, 
     assignments: List[Dict[str, Any]], 
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
 ):
     """
     Start a batch dispatch process for hall tickets.
     """
-    batch_id = f"BATCH_{datetime.now().strftime('%Y%m%d')}_{uuid.uuid4().hex[:4].upper()}"
-    
-    DISPATCH_REPORTS[batch_id] = {
-        "batch_id": batch_id,
-        "app_id": app_id,
-        "timestamp": datetime.now().isoformat(),
-        "original_assignments": assignments, # Store data for potential retries
-        "summary": {"total_requested": len(assignments), "success_count": 0, "failure_count": 0},
-        "details": []
-    }
+    batch_id = dispatch_store.new_batch_id("BATCH")
+
+    # Original assignments are stored per row for potential retries
+    dispatch_store.create_batch(
+        db,
+        batch_id,
+        [{"roll_number": s.get("roll"), "branch": s.get("branch"), "payload": s} for s in assignments],
+        kind="DISPATCH",
+        app_id=app_id,
+    )
+
+    # One worker per batch; rendering concurrency is capped by the shared pool
+    background_tasks.add_task(ticket_dispatcher.run_dispatch, batch_id, dispatch_ticket_path(app_id))
 
-    for student in assignments:
-        background_tasks.add_task(generate_and_save_ticket_task, student, app_id, batch_id)
-        
     return {"status": "STARTED", "batch_id": batch_id}
 
 @router.post("/dispatch/{batch_id}/retry")
-async def retrigger_failed_dispatch(
+def retrigger_failed_dispatch(
     batch_id: str, 
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db)
 ):
     """
     Finds all students who failed in the given batch and retries only those.
     """
-    report = DISPATCH_REPORTS.get(batch_id)
-    if not report:
+    batch = dispatch_store.get_batch(db, batch_id)
+    if not batch:
         raise HTTPException(status_code=404, detail="Batch ID not found.")
 
-    failed_rolls = [d["roll"] for d in report["details"] if d["status"] == "FAILED"]
+    retrying_count = dispatch_store.get_status_counts(db, batch_id).get(dispatch_store.STATUS_FAILED, 0)
     
-    if not failed_rolls:
+    if not retrying_count:
         return {"message": "No failed tickets to retry in this batch."}
 
-    # Filter original data for only the failed students
-    to_retry = [s for s in report["original_assignments"] if s["roll"] in failed_rolls]
-
-    for student in to_retry:
-        background_tasks.add_task(generate_and_save_ticket_task, student, report["app_id"], batch_id, is_retry=True)
+    if batch.kind == "PRERENDER":
+        # Release-time pre-render: same storage as downloads, and re-check the release threshold
+        if not ticket_dispatcher.claim_prerender(batch_id):
+            return {"message": "This release is still rendering; retry once it finishes."}
+        background_tasks.add_task(ticket_dispatcher.run_prerender, batch.exam_id, batch_id, retry_failed=True)
+    else:
+        background_tasks.add_task(
+            ticket_dispatcher.run_dispatch,
+            batch_id,
+            dispatch_ticket_path(batch.app_id),
+            status=dispatch_store.STATUS_FAILED,
+            is_retry=True,
+        )
 
     return {
         "status": "RETRY_STARTED",
-        "retrying_count": len(to_retry),
-        "message": f"Attempting to fix {len(to_retry)} failed tickets."
+        "retrying_count": retrying_count,
+        "message": f"Attempting to fix {retrying_count} failed tickets."
     }
 
+def _roll_from_filename(filename: str) -> str:
+    # Extraction logic: Try to find a specific roll number pattern (e.g. 22R21A6730)
+    clean_name = os.path.basename(filename)
+    # Pattern for standard 10-char roll numbers (Starts with Year, contains college code)
+    roll_match = re.search(r'([0-9]{2}[A-Z][0-9]{2}[A-Z][0-9A-Z]{4})', clean_name.upper())
+    if not roll_match:
+        # Fallback to any 8-12 char alphanumeric string that contains at least one digit
+        roll_match = re.search(r'([0-9A-Z]{8,12})', clean_name.upper())
+    return roll_match.group(1) if roll_match else clean_name.split('.')[0]
+
+def _spool_upload(upload_file) -> str:
+    """Copies the upload to a temp file on disk in fixed-size chunks; returns its path."""
+    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as spool:
+        shutil.copyfileobj(upload_file, spool, UPLOAD_COPY_CHUNK)
+        return spool.name
+
+def _list_ticket_members(zip_path: str) -> List[tuple]:
+    """Returns (member_name, roll_no) for every ticket file in the archive, reading only the central directory."""
+    with zipfile.ZipFile(zip_path) as z:
+        return [
+            (name, _roll_from_filename(name))
+            for name in z.namelist()
+            if not name.endswith('/') and '__MACOSX' not in name
+        ]
+
+def _extract_members(zip_path: str, jobs: List[tuple], exam_id: int) -> Dict[str, str]:
+    """
+    Streams the given (member_name, roll_no) entries to storage/<exam_id>/<roll>.pdf.
+    Each worker opens its own ZipFile handle. Returns {member_name: error} for failures.
+    """
+    errors = {}
+    exam_dir = STORAGE_BASE / str(exam_id)
+    exam_dir.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as z:
+        for member_name, roll_no in jobs:
+            target_path = exam_dir / f"{roll_no}.pdf"
+            tmp_path = exam_dir / f".{roll_no}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with z.open(member_name) as src, open(tmp_path, "wb") as dst:
+                    shutil.copyfileobj(src, dst, UPLOAD_COPY_CHUNK)
+                os.replace(tmp_path, target_path)
+            except Exception as e:
+                errors[member_name] = str(e)
+                if tmp_path.exists():
+                    tmp_path.unlink()
+    return errors
+
+def _resolve_branches(db: Session, rolls: List[str]) -> Dict[str, str]:
+    """Roll number -> branch name for every known student, in a single IN query."""
+    if not rolls:
+        return {}
+    rows = db.query(models.Student.roll_number, models.Branch.name).outerjoin(
+        models.Branch, models.Student.branch_id == models.Branch.id
+    ).filter(models.Student.roll_number.in_(rolls)).all()
+    return {roll: (branch or "Unknown") for roll, branch in rows}
+
 @router.post("/bulk-upload")
 async def bulk_upload_hall_tickets(
     exam_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user)
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
 ):
     """
     Administrator uploads a ZIP of hall tickets.
     Matches filenames (e.g. 21CSE001.pdf) to Roll Numbers.
+    The archive is spooled to disk and extracted by a thread pool, so memory
+    stays flat and the event loop is never blocked by file or DB I/O.
     """
-    import zipfile
-    import io
-
     if current_user.role not in ["Admin", "Seating Manager"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     if not file.filename.endswith('.zip'):
         raise HTTPException(status_code=400, detail="Please upload a .zip file")
 
-    batch_id = f"UPLOAD_{datetime.now().strftime('%Y%m%d')}_{uuid.uuid4().hex[:4].upper()}"
-    
-    report = {
-        "batch_id": batch_id,
-        "exam_id": exam_id,
-        "summary": {"total_files": 0, "success_count": 0, "failure_count": 0},
-        "details": [],
-        "branch_wise": {}
-    }
+    batch_id = dispatch_store.new_batch_id("UPLOAD")
+    zip_path = None
 
     try:
-        content = await file.read()
-        z = zipfile.ZipFile(io.BytesIO(content))
-        
-        for filename in z.namelist():
-            if filename.endswith('/') or '__MACOSX' in filename: continue
-            
-            report["summary"]["total_files"] += 1
-            
-            # Extraction logic: Try to find a specific roll number pattern (e.g. 22R21A6730)
-            clean_name = os.path.basename(filename)
-            # Pattern for standard 10-char roll numbers (Starts with Year, contains college code)
-            roll_match = re.search(r'([0-9]{2}[A-Z][0-9]{2}[A-Z][0-9A-Z]{4})', clean_name.upper())
-            if not roll_match:
-                # Fallback to any 8-12 char alphanumeric string that contains at least one digit
-                roll_match = re.search(r'([0-9A-Z]{8,12})', clean_name.upper())
-            
-            roll_no = roll_match.group(1) if roll_match else clean_name.split('.')[0]
-            
-            # Find student and branch
-            student = db.query(models.Student).options(joinedload(models.Student.branch)).filter(models.Student.roll_number == roll_no).first()
-            branch_name = student.branch.name if (student and student.branch) else "Unknown"
-            
-            if branch_name not in report["branch_wise"]:
-                report["branch_wise"][branch_name] = {"success": 0, "failure": 0}
-
-            try:
-                if not student:
-                    raise ValueError(f"Student with roll number {roll_no} not found in database")
-                
-                # Copy file to storage
-                target_path = STORAGE_BASE / str(exam_id) / f"{roll_no}.pdf"
-                target_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(target_path, "wb") as f:
-                    f.write(z.read(filename))
-                
-                report["summary"]["success_count"] += 1
-                report["branch_wise"][branch_name]["success"] += 1
-                report["details"].append({"roll": roll_no, "branch": branch_name, "status": "SUCCESS", "error": None})
-                
-            except Exception as e:
-                report["summary"]["failure_count"] += 1
-                report["branch_wise"][branch_name]["failure"] += 1
-                report["details"].append({"roll": roll_no, "branch": branch_name, "status": "FAILED", "error": str(e)})
+        zip_path = await asyncio.to_thread(_spool_upload, file.file)
+        members = await asyncio.to_thread(_list_ticket_members, zip_path)
+
+        # 1. Resolve every roll number up front
+        branch_by_roll = await asyncio.to_thread(_resolve_branches, db, list({roll for _, roll in members}))
+
+        # 2. Extract known students' files in parallel slices
+        to_extract = [(name, roll) for name, roll in members if roll in branch_by_roll]
+        workers = max(1, config.UPLOAD_EXTRACT_WORKERS)
+        slice_size = max(1, -(-len(to_extract) // workers))
+        loop = asyncio.get_running_loop()
+        slices = await asyncio.gather(*(
+            loop.run_in_executor(_extract_pool, _extract_members, zip_path, to_extract[i:i + slice_size], exam_id)
+            for i in range(0, len(to_extract), slice_size)
+        ))
+        extract_errors = {}
+        for errors in slices:
+            extract_errors.update(errors)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"ZIP Processing Error: {str(e)}")
-
-    DISPATCH_REPORTS[batch_id] = report
+    finally:
+        if zip_path and os.path.exists(zip_path):
+            os.remove(zip_path)
+
+    # 3. Build the report in archive order
+    details = []
+    branch_wise = {}
+    for name, roll_no in members:
+        branch_name = branch_by_roll.get(roll_no, "Unknown")
+        counts = branch_wise.setdefault(branch_name, {"success": 0, "failure": 0})
+        if roll_no not in branch_by_roll:
+            error = f"Student with roll number {roll_no} not found in database"
+        else:
+            error = extract_errors.get(name)
+        counts["failure" if error else "success"] += 1
+        details.append({"roll": roll_no, "branch": branch_name, "status": "FAILED" if error else "SUCCESS", "error": error})
+
+    await asyncio.to_thread(
+        dispatch_store.create_batch,
+        db,
+        batch_id,
+        [{"roll_number": d["roll"], "branch": d["branch"], "status": d["status"], "error": d["error"]} for d in details],
+        kind="UPLOAD",
+        exam_id=exam_id,
+    )
     
     # Format for frontend
     formatted_branch_report = [
         {"branch_name": b, "success_count": s["success"], "failure_count": s["failure"]}
-        for b, s in report["branch_wise"].items()
+        for b, s in branch_wise.items()
     ]
+    success_count = sum(s["success"] for s in branch_wise.values())
 
     return {
         "batch_id": batch_id,
-        "total_processed": report["summary"]["total_files"],
-        "overall_success": report["summary"]["success_count"],
-        "overall_failure": report["summary"]["failure_count"],
+        "total_processed": len(details),
+        "overall_success": success_count,
+        "overall_failure": len(details) - success_count,
         "branch_wise_report": formatted_branch_report,
-        "details": report["details"]
+        "details": details
     }
 
 @router.get("/dispatch/{batch_id}/report")
-async def get_dispatch_report(batch_id: str):
+def get_dispatch_report(batch_id: str, db: Session = Depends(get_db)):
     """
     Get the status report for a dispatch batch.
     """
-    report = DISPATCH_REPORTS.get(batch_id)
-    if not report: raise HTTPException(status_code=404, detail="Batch ID not found.")
-
-    branch_map = {}
-    for entry in report["details"]:
-        br = entry["branch"]
-        if br not in branch_map: branch_map[br] = {"success": [], "failed": []}
-        if entry["status"] == "SUCCESS": branch_map[br]["success"].append(entry["roll"])
-        else: branch_map[br]["failed"].append({"roll": entry["roll"], "reason": entry["error"]})
+    batch = dispatch_store.get_batch(db, batch_id)
+    if not batch: raise HTTPException(status_code=404, detail="Batch ID not found.")
 
     return {
-        "metadata": report["summary"],
-        "branch_wise_status": branch_map
+        "metadata": dispatch_store.get_summary(db, batch),
+        "branch_wise_status": dispatch_store.get_branch_rollup(db, batch_id)
     }
 
 class VerificationRequest(BaseModel):
@@ -269,12 +270,19 @@ class VerificationRequest(BaseModel):
 @router.get("/{exam_id}/download")
 def download_hall_ticket(
     exam_id: int,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """
     Generate and download Hall Ticket PDF for the logged-in student and specific exam.
     """
+    # 0. Uploaded by an admin, or pre-rendered at release? Serve the static file.
+    roll = db.query(models.Student.roll_number).filter(models.Student.user_id == current_user.id).first()
+    if roll:
+        for stored in (STORAGE_BASE / str(exam_id) / f"{roll[0]}.pdf", ticket_dispatcher.prerender_dir(exam_id) / f"{roll[0]}.pdf"):
+            if stored.is_file():
+                return FileResponse(stored, media_type="application/pdf", filename=f"HallTicket_{roll[0]}_{exam_id}.pdf")
+
     # 1. Identify Student
     student = db.query(models.Student).options(
         joinedload(models.Student.branch).joinedload(models.Branch.program)
@@ -301,11 +309,12 @@ def download_hall_ticket(
 
     # 4. Generate QR Token/Payload
     # In a real system, we might save this token to a DB to track "is_used".
-    # Here we generate a stateless signed-like payload.
-    # Token = Simple Hash of IDs for now (or UUID).
-    import hashlib
-    token_source = f"{student.id}-{exam.id}-{allocation.seat.seat_label}"
-    unique_token = hashlib.sha256(token_source.encode()).hexdigest()[:10].upper()
+    # The payload is HMAC-signed with a validity window, so scanners can trust it as-is.
+    unique_token = make_ticket_token(student.id, exam.id, allocation.seat.seat_label)
+
+    valid_from, valid_until = validity_window(
+        exam.start_time, exam.duration_minutes, config.QR_VALID_BEFORE_MINUTES, config.QR_VALID_AFTER_MINUTES
+    )
 
     qr_base64, raw_payload = generate_qr_image_and_payload(
         student_id=str(student.roll_number), # Using Roll No as ID in QR for visibility
@@ -313,18 +322,17 @@ def download_hall_ticket(
         seat_id=allocation.seat.seat_label,
         exam_id=str(exam.id), # Internal ID
         allocated_room=allocation.room.name,
-        unique_token=unique_token
+        unique_token=unique_token,
+        valid_from=valid_from,
+        valid_until=valid_until,
+        signing_key=config.QR_SIGNING_KEY
     )
 
     # 5. Generate PDF
-    # Priority: Course Title > Course Name > Exam Title > Course Code > "Exam"
-    title_text = "Exam"
-    if exam.course:
-        title_text = exam.course.title or exam.course.name or exam.course.code or "Exam"
-    
-    # If course missing or title empty, try exam's own title
-    if title_text == "Exam" and exam.exam_title:
-        title_text = exam.exam_title
+    course = exam.course
+    title_text = pdf_utils.exam_title(
+        course.title if course else None, course.name if course else None, course.code if course else None, exam.title
+    )
 
     pdf_buffer = generate_hall_ticket_buffer(
         student_name=current_user.name or current_user.email.split('@')[0],
@@ -347,6 +355,81 @@ def download_hall_ticket(
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+def _verify_scan(
+    db: Session,
+    raw_payload: str,
+    invigilator_exam_id: str,
+    invigilator_room_id: Optional[str],
+    student_exists: Callable[[str], bool]
+):
+    """
+    Verifies one scanned payload. Returns (response, entry); entry is the matched
+    VerificationEntry for MATCH results, else None.
+    Signed payloads are authenticated from their own contents; the only remaining
+    check is revocation (seat/room changed since issue) against the in-memory index.
+    """
+    # 1. Parse Payload
+    # Use split(':', 1) to be safer with values containing colons
+    # Trim whitespace from the raw payload
+    clean_payload = raw_payload.strip()
+    parts = parse_qr_payload(clean_payload)
+    
+    roll_number = parts.get('ROLL')
+    exam_id_str = parts.get('EXAM')
+    seat_label = parts.get('SEAT')
+    scanned_room = parts.get('ROOM') # Extract scanned room from QR payload
+    
+    # Only ROLL, EXAM, and SEAT are strictly required for identity
+    if not roll_number or not exam_id_str or not seat_label:
+         return {"status": "MISMATCH", "message": "Invalid QR format or missing data"}, None
+
+    # Authenticity and validity window (no DB access)
+    is_signed = 'SIG' in parts
+    if is_signed or config.QR_REQUIRE_SIGNATURE:
+         if not config.QR_SIGNING_KEY:
+              return {"status": "MISMATCH", "message": "QR signature verification is not configured"}, None
+         rejection = check_signed_payload(clean_payload, config.QR_SIGNING_KEY)
+         if rejection:
+              return {"status": "MISMATCH", "message": rejection}, None
+
+    # 2. Check Contexts
+    # Check Exam Match
+    if exam_id_str != invigilator_exam_id:
+         return {"status": "MISMATCH", "message": f"Wrong Exam! Ticket for {exam_id_str}"}, None
+
+    # Check Room Match (Location Security)
+    if invigilator_room_id and scanned_room != invigilator_room_id:
+         return {"status": "MISMATCH", "message": f"Wrong Room! Allocated to {scanned_room}"}, None
+
+    # 3. Verify against the exam's in-memory index (one query per exam, not per scan)
+    entry = verification_index.lookup(db, int(exam_id_str), roll_number)
+
+    if is_signed:
+         # Fields are authentic; only check the ticket has not been superseded
+         if not entry or entry.seat_label != seat_label or (scanned_room and entry.room_name != scanned_room):
+              return {"status": "MISMATCH", "message": "Ticket Revoked: allocation changed"}, None
+
+    if not entry:
+         # Rare path: tell "unknown student" apart from "not seated"
+         if not student_exists(roll_number):
+              return {"status": "MISMATCH", "message": "Student not found"}, None
+         return {"status": "MISMATCH", "message": "No seat allocated"}, None
+
+    if entry.seat_label != seat_label:
+         return {"status": "MISMATCH", "message": "Seat Mismatch"}, None
+
+    # 4. Success - Return format expected by scanner_app.py
+    return {
+        "status": "MATCH",
+        "message": "Verified",
+        "student_info": {
+            "id": parts.get('ID'),
+            "roll": roll_number,
+            "seat": seat_label,
+            "name": entry.name
+        }
+    }, entry
+
 @router.post("/verify")
 def verify_qr_token(
     req: VerificationRequest,
@@ -354,188 +437,387 @@ def verify_qr_token(
 ):
     """
     Verify a scanned QR code.
-    Payload Format: ID:STU...|ROLL:...|SEAT:...|EXAM:...|TOKEN:...
+    Payload Format: ID:STU...|ROLL:...|SEAT:...|EXAM:...|ROOM:...|TOKEN:...[|VALID:from-until|SIG:...]
     """
     try:
-        # 1. Parse Payload
-        # Use split(':', 1) to be safer with values containing colons
-        # Trim whitespace from the raw payload
-        clean_payload = req.raw_payload.strip()
-        print(f"DEBUG: Verifying QR Payload: {clean_payload}")
-        
-        parts = {}
-        for p in clean_payload.split('|'):
-            if ':' in p:
-                key, val = p.split(':', 1)
-                parts[key.strip()] = val.strip()
-        
-        roll_number = parts.get('ROLL')
-        exam_id_str = parts.get('EXAM')
-        seat_label = parts.get('SEAT')
-        scanned_room = parts.get('ROOM') # Extract scanned room from QR payload
-        
-        # Only ROLL, EXAM, and SEAT are strictly required for identity
-        if not roll_number or not exam_id_str or not seat_label:
-             print(f"DEBUG: Missing fields in parts: {parts}")
-             return {"status": "MISMATCH", "message": "Invalid QR format or missing data"}
-
-        # 2. Check Contexts
-        # Check Exam Match
-        if exam_id_str != req.invigilator_exam_id:
-             return {"status": "MISMATCH", "message": f"Wrong Exam! Ticket for {exam_id_str}"}
-
-        # Check Room Match (Location Security)
-        if req.invigilator_room_id and scanned_room != req.invigilator_room_id:
-             return {"status": "MISMATCH", "message": f"Wrong Room! Allocated to {scanned_room}"}
-
-        # 3. Verify Database Record
-        student = db.query(models.Student).filter(models.Student.roll_number == roll_number).first()
-        if not student:
-             return {"status": "MISMATCH", "message": "Student not found"}
-
-        allocation = db.query(models.SeatAllocation).filter(
-            models.SeatAllocation.exam_id == int(exam_id_str),
-            models.SeatAllocation.student_id == student.id
-        ).first()
-
-        if not allocation:
-             return {"status": "MISMATCH", "message": "No seat allocated"}
-
-        if allocation.seat.seat_label != seat_label:
-             return {"status": "MISMATCH", "message": "Seat Mismatch"}
-
-        # 4. Success - Return format expected by scanner_app.py
-        return {
-            "status": "MATCH",
-            "message": "Verified",
-            "student_info": {
-                "id": parts.get('ID'),
-                "roll": roll_number,
-                "seat": seat_label,
-                "name": student.user.name
-            }
-        }
+        def student_exists(roll_number: str) -> bool:
+            return db.query(models.Student.id).filter(models.Student.roll_number == roll_number).first() is not None
+
+        response, _ = _verify_scan(db, req.raw_payload, req.invigilator_exam_id, req.invigilator_room_id, student_exists)
+        return response
 
     except Exception as e:
         return {"status": "ERROR", "message": str(e)}
 
+class ScanItem(BaseModel):
+    raw_payload: str = Field(..., description="The full decoded string from the QR code.")
+    scanned_at: Optional[datetime] = Field(None, description="When the device scanned it (defaults to receipt time).")
+
+class BatchVerificationRequest(BaseModel):
+    scans: List[ScanItem] = Field(..., max_length=2000, description="Buffered scans from one scanner.")
+    invigilator_exam_id: str = Field(..., description="Exam ID configured on scanner.")
+    invigilator_room_id: Optional[str] = Field(None, description="Physical room ID where the scanner is located.")
+    scanner_id: Optional[str] = Field(None, description="Device identifier, stored with attendance.")
+    record_attendance: bool = True
+
+@router.post("/verify/batch")
+def verify_qr_tokens_batch(
+    req: BatchVerificationRequest,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    db: Session = Depends(get_db)
+):
+    """
+    Verify many scans at once (offline buffers, fast door scanning).
+    Scans are checked against the exam's in-memory index; unknown rolls are
+    resolved with one IN query. MATCHes are recorded as attendance in a
+    single bulk insert (first scan per student wins).
+    """
+    if current_user.role not in ["Admin", "Seating Manager", "Faculty"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    # Resolve rolls the index doesn't know, all at once
+    known_rolls = set()
+    try:
+        exam_index = verification_index.get_exam_index(db, int(req.invigilator_exam_id))
+        unseated = {parse_qr_payload(scan.raw_payload).get('ROLL') for scan in req.scans} - set(exam_index) - {None}
+        if unseated:
+            known_rolls = {roll for (roll,) in db.query(models.Student.roll_number).filter(
+                models.Student.roll_number.in_(unseated)
+            ).all()}
+    except ValueError:
+        pass # Non-numeric exam id: every scan below reports its own ERROR
+
+    now = datetime.utcnow()
+    results = []
+    attendance = {}
+    for i, scan in enumerate(req.scans):
+        try:
+            response, entry = _verify_scan(
+                db, scan.raw_payload, req.invigilator_exam_id, req.invigilator_room_id, known_rolls.__contains__
+            )
+        except Exception as e:
+            response, entry = {"status": "ERROR", "message": str(e)}, None
+
+        results.append({"index": i, **response})
+        if entry and entry.student_id not in attendance:
+            attendance[entry.student_id] = {
+                "exam_id": int(req.invigilator_exam_id),
+                "student_id": entry.student_id,
+                "room_id": entry.room_id,
+                "scanned_at": scan.scanned_at or now,
+                "scanner_id": req.scanner_id,
+                "recorded_by": current_user.id,
+            }
+
+    recorded = 0
+    if req.record_attendance and attendance:
+        already = {sid for (sid,) in db.query(models.ExamAttendance.student_id).filter(
+            models.ExamAttendance.exam_id == int(req.invigilator_exam_id),
+            models.ExamAttendance.student_id.in_(list(attendance))
+        ).all()}
+        rows = [row for sid, row in attendance.items() if sid not in already]
+        if rows:
+            # IGNORE: a concurrent batch may have recorded the same student meanwhile
+            stmt = insert(models.ExamAttendance).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+            db.execute(stmt, rows)
+            db.commit()
+        recorded = len(rows)
+
+    matched = sum(1 for r in results if r["status"] == "MATCH")
+    errors = sum(1 for r in results if r["status"] == "ERROR")
+    return {
+        "exam_id": req.invigilator_exam_id,
+        "summary": {
+            "total": len(results),
+            "matched": matched,
+            "mismatched": len(results) - matched - errors,
+            "errors": errors,
+            "attendance_recorded": recorded,
+        },
+        "results": results,
+    }
+
+@router.get("/exam/{exam_id}/manifest")
+def get_offline_manifest(
+    exam_id: int,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    room_id: Optional[int] = None,
+    since: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Offline verification manifest for scanner devices, optionally for one room.
+    Body: gzip-compressed JSON {version, records: [[roll, seat, room, name], ...] sorted by roll, removed: [...]}.
+    Pass ?since=<version> to receive only changes after a manifest the device already holds.
+    X-Manifest-Signature is a hex Ed25519 signature of the body; verify it with /manifest/public-key.
+    """
+    if current_user.role not in ["Admin", "Seating Manager", "Faculty"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if not config.MANIFEST_SIGNING_KEY:
+        raise HTTPException(status_code=503, detail="Offline manifests are disabled: MANIFEST_SIGNING_KEY is not set")
+
+    exam = db.query(models.Exams.id).filter(models.Exams.id == exam_id).first()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    manifest = offline_manifest.build_manifest(db, exam_id, room_id=room_id, since=since)
+    body, signature = offline_manifest.encode_manifest(manifest, config.MANIFEST_SIGNING_KEY)
+
+    kind = "delta" if since is not None else "full"
+    filename = f"Manifest_Exam_{exam_id}{f'_Room_{room_id}' if room_id else ''}_v{manifest['version']}_{kind}.json.gz"
+    return Response(
+        content=body,
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Manifest-Version": str(manifest["version"]),
+            "X-Manifest-Signature": signature,
+        }
+    )
+
+@router.get("/manifest/public-key")
+def get_manifest_public_key(
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)]
+):
+    """Ed25519 public key (base64, raw 32 bytes) that scanner devices check manifest signatures with."""
+    if current_user.role not in ["Admin", "Seating Manager", "Faculty"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    if not config.MANIFEST_SIGNING_KEY:
+        raise HTTPException(status_code=503, detail="Offline manifests are disabled: MANIFEST_SIGNING_KEY is not set")
+    return {"algorithm": "Ed25519", "public_key": offline_manifest.public_key(config.MANIFEST_SIGNING_KEY)}
+
+@router.post("/exam/{exam_id}/room-packs")
+async def generate_room_packs(
+    exam_id: int,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    room_ids: Optional[List[int]] = Query(None, description="Limit to these rooms; default is every room used by the exam"),
+    db: Session = Depends(get_db)
+):
+    """
+    Renders invigilator packs (seating chart, attendance sheet, door list) for each room
+    of an exam in parallel and stores them for download.
+    """
+    if current_user.role not in ["Admin", "Seating Manager"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    exam = db.query(models.Exams.id).filter(models.Exams.id == exam_id).first()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Exam not found")
+
+    report = await room_packs.render_room_packs(db, exam_id, room_ids)
+    if not report:
+        raise HTTPException(status_code=400, detail="No seats allocated for this exam")
+
+    rooms = [
+        {"room_id": room_id, **{k: v for k, v in entry.items() if k != "path"}}
+        for room_id, entry in report.items()
+    ]
+    return {
+        "exam_id": exam_id,
+        "rooms_rendered": sum(1 for r in rooms if "error" not in r),
+        "rooms_failed": sum(1 for r in rooms if "error" in r),
+        "rooms": rooms,
+    }
+
+@router.get("/exam/{exam_id}/room-packs/{room_id}")
+async def download_room_pack(
+    exam_id: int,
+    room_id: int,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    db: Session = Depends(get_db)
+):
+    """Stored invigilator pack for one room, rendered on first request if missing."""
+    if current_user.role not in ["Admin", "Seating Manager", "Faculty"]:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+    path = room_packs.pack_path(exam_id, room_id)
+    if not path.is_file():
+        report = await room_packs.render_room_packs(db, exam_id, [room_id])
+        entry = report.get(room_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="No seats allocated in this room for the exam")
+        if "error" in entry:
+            raise HTTPException(status_code=500, detail=entry["error"])
+
+    return FileResponse(path, media_type="application/pdf", filename=f"RoomPack_Exam_{exam_id}_Room_{room_id}.pdf")
+
 @router.get("/all")
 def get_all_hall_tickets(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    response: Response,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    exam_id: Optional[int] = None,
+    room_id: Optional[int] = None,
+    status: Optional[str] = Query(None, description="Filter by exam status, e.g. HALL_TICKETS_RELEASED"),
+    after_id: Optional[int] = Query(None, description="Cursor: id of the last ticket of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db)
 ):
     """
-    Get all generated hall tickets (seat allocations) for Seating Managers.
+    Get generated hall tickets (seat allocations) for Seating Managers, one page at a time.
+    Pages are ordered by id; while more remain, pass the X-Next-Cursor response header back as after_id.
     """
     # Verify role (Admin or Seating Manager)
     if current_user.role not in ["Admin", "Seating Manager"]:
          raise HTTPException(status_code=403, detail="Not authorized")
 
-    allocations = db.query(models.SeatAllocation).options(
-        joinedload(models.SeatAllocation.student).joinedload(models.Student.user),
-        joinedload(models.SeatAllocation.exam).joinedload(models.Exams.course),
-        joinedload(models.SeatAllocation.seat),
-        joinedload(models.SeatAllocation.room)
-    ).all()
+    query = db.query(
+        models.SeatAllocation.id,
+        models.User.name,
+        models.Student.roll_number,
+        models.Course.title,
+        models.Course.name,
+        models.Exams.title,
+        models.RoomSeat.seat_label,
+        models.Room.name,
+    ).select_from(models.SeatAllocation).join(
+        models.Student, models.SeatAllocation.student_id == models.Student.id
+    ).outerjoin(
+        models.User, models.Student.user_id == models.User.id
+    ).join(
+        models.Exams, models.SeatAllocation.exam_id == models.Exams.id
+    ).outerjoin(
+        models.Course, models.Exams.course_id == models.Course.id
+    ).join(
+        models.RoomSeat, models.SeatAllocation.seat_id == models.RoomSeat.id
+    ).join(
+        models.Room, models.SeatAllocation.room_id == models.Room.id
+    )
+
+    if exam_id is not None:
+        query = query.filter(models.SeatAllocation.exam_id == exam_id)
+    if room_id is not None:
+        query = query.filter(models.SeatAllocation.room_id == room_id)
+    if status is not None:
+        query = query.filter(models.Exams.status == status)
+    if after_id is not None:
+        query = query.filter(models.SeatAllocation.id > after_id)
+
+    # One extra row tells us whether another page exists
+    rows = query.order_by(models.SeatAllocation.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
     results = []
-    for alloc in allocations:
-        # Determine status - if allocation exists, it's technically "Generated" or "Ready"
-        # We can refine this logic later if we have explicit status flags
-        status = "Generated" 
-        
-        exam_title = "Exam"
-        if alloc.exam.course:
-            exam_title = alloc.exam.course.title or alloc.exam.course.name
-        elif alloc.exam.exam_title:
-            exam_title = alloc.exam.exam_title
+    for alloc_id, student_name, roll_number, course_title, course_name, exam_title_raw, seat_label, room_name in rows:
+        exam_title = course_title or course_name or exam_title_raw or "Exam"
 
         results.append({
-            "id": alloc.id,
-            "name": alloc.student.user.name,
-            "roll": alloc.student.roll_number,
+            "id": alloc_id,
+            "name": student_name,
+            "roll": roll_number,
             "exam": exam_title,
-            "seat": alloc.seat.seat_label,
-            "status": status,
-            "room_name": alloc.room.name
+            "seat": seat_label,
+            # If allocation exists, it's technically "Generated"
+            "status": "Generated",
+            "room_name": room_name
         })
 
+    if has_more:
+        response.headers["X-Next-Cursor"] = str(rows[-1][0])
     return results
 
+REPORT_FIELDS = ["Roll Number", "Name", "Branch", "Seat", "Room", "File Released", "Status"]
+
+def _released_rolls(exam_dir: Path) -> set:
+    """Roll numbers with a PDF directly in exam_dir, from a single directory listing."""
+    if not exam_dir.is_dir():
+        return set()
+    with os.scandir(exam_dir) as entries:
+        return {e.name[:-4] for e in entries if e.name.endswith(".pdf") and e.is_file()}
+
+def _stream_report_rows(exam_id: int, is_cloud_released: bool, released_rolls: set, prerendered_rolls: set):
+    """Yields the CSV in ~1000-row pieces. Uses its own session: it runs after the endpoint returns."""
+    import csv
+    import io
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REPORT_FIELDS)
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            models.Student.roll_number,
+            models.User.name,
+            models.Branch.name,
+            models.SeatAllocation.id,
+            models.RoomSeat.seat_label,
+            models.Room.name,
+        ).select_from(models.ExamStudent).join(
+            models.Student, models.ExamStudent.student_id == models.Student.id
+        ).outerjoin(
+            models.User, models.Student.user_id == models.User.id
+        ).outerjoin(
+            models.Branch, models.Student.branch_id == models.Branch.id
+        ).outerjoin(
+            models.SeatAllocation,
+            (models.SeatAllocation.student_id == models.Student.id) & (models.SeatAllocation.exam_id == exam_id)
+        ).outerjoin(
+            models.RoomSeat, models.SeatAllocation.seat_id == models.RoomSeat.id
+        ).outerjoin(
+            models.Room, models.SeatAllocation.room_id == models.Room.id
+        ).filter(models.ExamStudent.exam_id == exam_id).yield_per(1000)
+
+        for count, (roll_number, name, branch, alloc_id, seat_label, room_name) in enumerate(rows, 1):
+            uploaded = roll_number in released_rolls
+            file_exists = uploaded or roll_number in prerendered_rolls
+
+            status = "PENDING"
+            if alloc_id and uploaded:
+                status = "DELIVERED (UPLOAD)"
+            elif alloc_id and file_exists:
+                status = "DELIVERED (PRERENDERED)"
+            elif alloc_id and is_cloud_released:
+                # If exam is released, they can download dynamic tickets on-the-fly
+                status = "READY (CLOUD)"
+            elif alloc_id and not file_exists:
+                status = "MISSING_FILE"
+            elif not alloc_id:
+                status = "NO_ALLOCATION"
+
+            writer.writerow([
+                roll_number,
+                name or "N/A",
+                branch or "N/A",
+                seat_label or "-",
+                room_name or "-",
+                "YES" if (file_exists or is_cloud_released) else "NO",
+                status,
+            ])
+
+            if count % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+    finally:
+        db.close()
+
+    yield buffer.getvalue()
+
 @router.get("/exam/{exam_id}/report")
 def get_exam_hall_ticket_report(
     exam_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user)
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
 ):
     """
-    Generates a CSV report of all students for a specific exam and their 
+    Streams a CSV report of all students for a specific exam and their 
     hall ticket dispatch status (Allocated vs Dispatched).
     """
-    import csv
-    import io
-
     if current_user.role not in ["Admin", "Seating Manager"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
 
-    # 1. Fetch exam and students with relations
-    exam = db.query(models.Exams).filter(models.Exams.id == exam_id).first()
-    if not exam:
+    exam_status = db.query(models.Exams.status).filter(models.Exams.id == exam_id).first()
+    if not exam_status:
         raise HTTPException(status_code=404, detail="Exam not found")
 
-    students = db.query(models.Student).options(
-        joinedload(models.Student.user),
-        joinedload(models.Student.branch)
-    ).join(models.ExamStudent).filter(models.ExamStudent.exam_id == exam_id).all()
-    
-    # 2. Get Allocations for mapping
-    allocations = db.query(models.SeatAllocation).options(
-        joinedload(models.SeatAllocation.seat),
-        joinedload(models.SeatAllocation.room)
-    ).filter(models.SeatAllocation.exam_id == exam_id).all()
-    alloc_map = {a.student_id: a for a in allocations}
-
-    # 3. Create CSV in memory
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=["Roll Number", "Name", "Branch", "Seat", "Room", "File Released", "Status"])
-    writer.writeheader()
-
-    exam_dir = STORAGE_BASE / str(exam_id)
-    is_cloud_released = (exam.status == "HALL_TICKETS_RELEASED")
-
-    for student in students:
-        alloc = alloc_map.get(student.id)
-        
-        # Check if file exists in storage
-        file_path = exam_dir / f"{student.roll_number}.pdf"
-        file_exists = file_path.exists()
-        
-        status = "PENDING"
-        if alloc and file_exists:
-            status = "DELIVERED (UPLOAD)"
-        elif alloc and is_cloud_released:
-            # If exam is released, they can download dynamic tickets on-the-fly
-            status = "READY (CLOUD)"
-        elif alloc and not file_exists:
-            status = "MISSING_FILE"
-        elif not alloc:
-            status = "NO_ALLOCATION"
-
-        writer.writerow({
-            "Roll Number": student.roll_number,
-            "Name": student.user.name if student.user else "N/A",
-            "Branch": student.branch.name if student.branch else "N/A",
-            "Seat": alloc.seat.seat_label if (alloc and alloc.seat) else "-",
-            "Room": alloc.room.name if (alloc and alloc.room) else "-",
-            "File Released": "YES" if (file_exists or is_cloud_released) else "NO",
-            "Status": status
-        })
+    is_cloud_released = (exam_status[0] == "HALL_TICKETS_RELEASED")
+    released_rolls = _released_rolls(STORAGE_BASE / str(exam_id))
+    prerendered_rolls = _released_rolls(ticket_dispatcher.prerender_dir(exam_id))
 
-    # Prepare response
-    output.seek(0)
     filename = f"HallTicketReport_Exam_{exam_id}.csv"
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode()),
+        _stream_report_rows(exam_id, is_cloud_released, released_rolls, prerendered_rolls),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, BackgroundTasks, Query
 from sqlalchemy.orm import Session
-from typing import List, Annotated
+from typing import List, Annotated, Optional
+import asyncio
+import functools
 import os
 import shutil
 import uuid
@@ -8,8 +10,7 @@ import uuid
 from db import SessionLocal
 import models, schemas
 import auth_router
-from utils.pdf_utils import extract_text_from_pdf
-from utils.mind_map_generator import generate_mind_map_json
+from utils import concept_search, mindmap_cache, mindmap_jobs, mindmap_tree
 
 router = APIRouter(prefix="/mindmaps", tags=["mindmaps"])
 
@@ -20,62 +21,76 @@ def get_db():
     finally:
         db.close()
 
-@router.post("/upload")
+MINDMAP_UPLOAD_DIR = os.path.join("/tmp", "storage", "mindmap_uploads")
+os.makedirs(MINDMAP_UPLOAD_DIR, exist_ok=True)
+
+def _spool_upload(upload_file, path):
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload_file, buffer)
+
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
 async def create_mind_map(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     """
     1. Upload PDF
-    2. Extract Text
-    3. Generate JSON via Gemini
-    4. Save to DB
+    2. Queue extraction + NLP generation in the mind-map process pool
+    3. Poll GET /mindmaps/jobs/{job_id} for the saved map
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # Generate a unique temp filename
+    # Generate a unique temp filename; the job removes it when done
     file_ext = file.filename.split(".")[-1]
-    temp_filename = os.path.join("/tmp", f"temp_{uuid.uuid4()}.{file_ext}")
-    
-    try:
-        with open(temp_filename, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 1. Extract Text
-        text = extract_text_from_pdf(temp_filename)
-        if not text:
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-
-        # 2. Generate Mind Map
-        # Limiting text to prevent context windows issues (handled in generator too)
-        mind_map_data = generate_mind_map_json(text)
-        
-        # 3. Save to DB
-        new_map = models.MindMap(
-            user_id=current_user.id,
-            title=file.filename,
-            data=mind_map_data
-        )
-        db.add(new_map)
-        db.commit()
-        db.refresh(new_map)
-        
-        return new_map
+    temp_filename = os.path.join(MINDMAP_UPLOAD_DIR, f"temp_{uuid.uuid4()}.{file_ext}")
 
+    try:
+        await asyncio.to_thread(_spool_upload, file.file, temp_filename)
+        job = await asyncio.to_thread(mindmap_jobs.create_job, db, current_user.id, file.filename)
     except Exception as e:
         print(f"MindMap Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Cleanup temp file
         if os.path.exists(temp_filename):
             os.remove(temp_filename)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    background_tasks.add_task(mindmap_jobs.run_upload_job, job.id, current_user.id, file.filename, temp_filename)
+    return {"job_id": job.id, "status": job.status}
+
+@router.get("/jobs/{job_id}")
+def get_mind_map_job(
+    job_id: int,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    db: Session = Depends(get_db)
+):
+    """Status of an upload or bulk-generation job; includes the mind map or report once completed."""
+    job = db.query(models.MindMapJob).filter(
+        models.MindMapJob.id == job_id, models.MindMapJob.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = {
+        "job_id": job.id,
+        "status": job.status,
+        "title": job.title,
+        "error": job.error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+        "mindmap_id": job.mindmap_id,
+        "mindmap": None,
+        "result": job.result,
+    }
+    if job.status == mindmap_jobs.STATUS_COMPLETED and job.mindmap_id:
+        result["mindmap"] = db.query(models.MindMap).filter(models.MindMap.id == job.mindmap_id).first()
+    return result
 
 @router.post("/generate-from-course/{course_id}")
 def generate_mind_map_from_course(
     course_id: int,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """
@@ -89,55 +104,103 @@ def generate_mind_map_from_course(
     if not course.syllabus_text:
         raise HTTPException(status_code=400, detail="This course does not have a syllabus defined by the admin.")
 
-    # 2. Check if user already has a map for this course (optional, but good practice to avoid duplicates or overwrite)
-    # For now, let's create a new one every time to allow regeneration.
-
     try:
-        # 3. Generate Mind Map
-        mind_map_data = generate_mind_map_json(course.syllabus_text)
-        
-        # 4. Save to DB
-        new_map = models.MindMap(
-            user_id=current_user.id,
-            title=f"{course.title} - Syllabus Map",
-            data=mind_map_data
+        # 2. Generate Mind Map, or reuse the one cached for this exact syllabus
+        entry, mind_map_data = mindmap_cache.get_or_generate(
+            db, course.syllabus_text, generate=functools.partial(mindmap_jobs.generate_blocking, persist=True)
         )
-        db.add(new_map)
-        db.commit()
-        db.refresh(new_map)
         
-        return new_map
+        # 3. One stored map per syllabus content, linked from the course
+        mind_map = mindmap_cache.shared_map(db, entry, mind_map_data, current_user.id, f"{course.title} - Syllabus Map")
+        if entry and course.mindmap_id != mind_map.id:
+            course.mindmap_id = mind_map.id
+            db.commit()
+            db.refresh(mind_map)
+            # Its map's node names are searchable as part of the course
+            concept_search.update_courses(db, [course_id])
+        
+        return mind_map
 
     except Exception as e:
         print(f"MindMap Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/bulk-generate", status_code=status.HTTP_202_ACCEPTED)
+def bulk_generate_course_mind_maps(
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_admin)],
+    background_tasks: BackgroundTasks,
+    course_ids: Optional[List[int]] = Query(None, description="Limit to these courses; default is the whole catalogue"),
+    force: bool = Query(False, description="Regenerate even up-to-date maps"),
+    db: Session = Depends(get_db)
+):
+    """
+    Admin: Queue generation of syllabus mind maps for every course whose map is missing
+    or stale, in parallel across the mind-map workers.
+    Poll GET /mindmaps/jobs/{job_id}; its result holds the counts and throughput.
+    """
+    job = mindmap_jobs.create_job(db, current_user.id, "Bulk course map generation")
+    background_tasks.add_task(mindmap_jobs.run_bulk_job, job.id, current_user.id, course_ids=course_ids, force=force)
+    return {"job_id": job.id, "status": job.status}
+
 @router.get("/mine")
 def get_my_mind_maps(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
-    return db.query(models.MindMap).filter(models.MindMap.user_id == current_user.id).order_by(models.MindMap.created_at.desc()).all()
+    # Metadata only; trees are fetched per map or per subtree
+    rows = db.query(
+        models.MindMap.id, models.MindMap.user_id, models.MindMap.title, models.MindMap.created_at
+    ).filter(models.MindMap.user_id == current_user.id).order_by(models.MindMap.created_at.desc()).all()
+    return [row._asdict() for row in rows]
+
+def _can_view(db: Session, map_id: int, owner_id: int, current_user: auth_router.Principal) -> bool:
+    if owner_id == current_user.id:
+        return True
+    return db.query(models.Course.id).filter(models.Course.mindmap_id == map_id).first() is not None
 
 @router.get("/{map_id}")
 def get_mind_map(
     map_id: int,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
-    # Allow fetching if user owns it
-    result = db.query(models.MindMap).filter(models.MindMap.id == map_id, models.MindMap.user_id == current_user.id).first()
-    if not result:
+    # Allow fetching if user owns it, or if it is a course's shared syllabus map
+    result = db.query(models.MindMap).filter(models.MindMap.id == map_id).first()
+    if not result or not _can_view(db, map_id, result.user_id, current_user):
         raise HTTPException(status_code=404, detail="Mind Map not found")
     return result
 
+@router.get("/{map_id}/node")
+def get_mind_map_node(
+    map_id: int,
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
+    path: str = "",
+    depth: int = Query(1, ge=0, le=5),
+    db: Session = Depends(get_db)
+):
+    """
+    One subtree for lazy expansion: the node at `path` (child indices from the root,
+    e.g. "0.2"; "" is the root) with `depth` levels of children. Nodes report child_count
+    so clients know what can still be expanded.
+    """
+    owner_id = db.query(models.MindMap.user_id).filter(models.MindMap.id == map_id).scalar()
+    if owner_id is None or not _can_view(db, map_id, owner_id, current_user):
+        raise HTTPException(status_code=404, detail="Mind Map not found")
+
+    node = mindmap_tree.get_subtree(db, map_id, path, depth)
+    if node is None:
+        raise HTTPException(status_code=404, detail="Node not found")
+    return {"map_id": map_id, **node}
+
 @router.get("/all/admin")
 def get_all_mind_maps_admin(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_admin)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_admin)],
     db: Session = Depends(get_db)
 ):
     """
     Admin: Fetch ALL generated mind maps.
     """
-    # Join with User to get creator info if needed, but default query loads IDs
-    return db.query(models.MindMap).order_by(models.MindMap.created_at.desc()).all()
+    rows = db.query(
+        models.MindMap.id, models.MindMap.user_id, models.MindMap.title, models.MindMap.created_at
+    ).order_by(models.MindMap.created_at.desc()).all()
+    return [row._asdict() for row in rows]
@@ -19,7 +19,7 @@ def get_db():
 
 @router.get("/me")
 def get_student_notifications(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     import json
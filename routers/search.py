@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+import time
+
+from db import get_db
+import auth_router
+from utils import concept_search
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("/concepts")
+def search_concepts(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
+):
+    """
+    Courses covering a concept, ranked by BM25 over course titles, syllabi and
+    mind-map node names, each with the map nodes that mention it.
+    """
+    started = time.perf_counter()
+    results = concept_search.search(db, q, limit)
+    return {
+        "query": q,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -92,7 +92,7 @@ from datetime import datetime
 
 @router.get("/me/dashboard-summary")
 def get_student_dashboard_summary(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """
@@ -183,7 +183,7 @@ def get_student_dashboard_summary(
 # NOTE: /me route MUST come before /{student_id} to avoid FastAPI matching "me" as a student_id parameter
 @router.get("/me", response_model=schemas.StudentRead)
 def get_current_student(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get the current authenticated student's profile"""
@@ -201,7 +201,7 @@ def get_current_student(
 @router.put("/me", response_model=schemas.StudentRead)
 def update_current_student(
     student_update: schemas.StudentUpdate,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Update calculation for current student"""
@@ -227,24 +227,24 @@ def update_current_student(
         # Students cannot update their own active status
     
     db.commit()
+    auth_router.invalidate_principal(current_user.email)
     db.refresh(student)
     return student
 
 
 @router.get("/me/results", response_model=List[schemas.StudentMarkRead])
 def get_my_results(
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)],
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)],
     db: Session = Depends(get_db)
 ):
     """Get the exam results for the current authenticated student."""
     from sqlalchemy.orm import joinedload
-    student = db.query(models.Student).filter(models.Student.user_id == current_user.id).first()
-    if not student:
+    if not current_user.student_id:
         raise HTTPException(status_code=404, detail="Student profile not found")
         
     marks = db.query(models.StudentMark)\
         .options(joinedload(models.StudentMark.course))\
-        .filter(models.StudentMark.student_id == student.id)\
+        .filter(models.StudentMark.student_id == current_user.student_id)\
         .all()
     return marks
 
@@ -279,6 +279,7 @@ def update_student(
         raise HTTPException(status_code=404, detail="Student not found")
     
     # 1. Update User fields FIRST so name/email are correct for notifications
+    previous_email = student.user.email if student.user else None
     if student.user:
         if student_update.name is not None:
             student.user.name = student_update.name
@@ -347,6 +348,8 @@ def update_student(
         student.academic_status = student_update.academic_status
     
     db.commit()
+    if student.user:
+        auth_router.invalidate_principal(previous_email, student.user.email)
     db.refresh(student)
     return student
 
@@ -354,7 +357,7 @@ def update_student(
 def bulk_import_students(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth_router.get_current_active_user)
+    current_user: auth_router.Principal = Depends(auth_router.get_current_active_user)
 ):
     """
     Bulk import students from CSV.
@@ -473,7 +476,7 @@ def bulk_import_students(
 @router.post("/evaluate-promotion-eligibility", response_model=schemas.PromotionCheckResponse)
 def check_promotion_eligibility(
     req: schemas.PromotionCheckRequest,
-    current_user: Annotated[models.User, Depends(auth_router.get_current_active_user)], # Admin/Faculty only ideally
+    current_user: Annotated[auth_router.Principal, Depends(auth_router.get_current_active_user)], # Admin/Faculty only ideally
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
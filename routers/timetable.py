@@ -5,7 +5,7 @@ from typing import List, Optional, Annotated
 from db import get_db
 import models
 import schemas
-from auth_router import get_current_active_user, get_current_active_admin, get_current_active_student
+from auth_router import Principal, get_current_active_user, get_current_active_admin, get_current_active_student
 from routers.faculty import get_current_faculty
 
 router = APIRouter(
@@ -34,7 +34,7 @@ def get_my_timetable(
 
 @router.get("/student/me", response_model=List[schemas.TimeTableEntryRead])
 def get_student_timetable(
-    current_student: models.User = Depends(get_current_active_student), # Actually returns User, need to get Student profile
+    current_student: Principal = Depends(get_current_active_student), # The user, not their Student profile
     db: Session = Depends(get_db)
 ):
     """
@@ -64,7 +64,7 @@ def get_student_timetable(
 @router.post("/assign", response_model=schemas.TimeTableEntryRead)
 def assign_timetable_slot(
     entry: schemas.TimeTableEntryCreate,
-    current_admin: models.User = Depends(get_current_active_admin),
+    current_admin: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -99,7 +99,7 @@ def assign_timetable_slot(
 
 @router.get("/", response_model=List[schemas.TimeTableEntryRead])
 def get_all_timetable_entries(
-    current_admin: models.User = Depends(get_current_active_admin),
+    current_admin: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -114,7 +114,7 @@ def get_all_timetable_entries(
 @router.delete("/{entry_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_timetable_entry(
     entry_id: int,
-    current_admin: models.User = Depends(get_current_active_admin),
+    current_admin: Principal = Depends(get_current_active_admin),
     db: Session = Depends(get_db)
 ):
     """
@@ -160,6 +160,7 @@ class CourseUpdate(BaseModel):
     description: Optional[str] = None
     is_active: Optional[bool] = None
     syllabus_file_id: Optional[int] = None
+    syllabus_text: Optional[str] = None
 
 class CourseRead(CourseBase):
     id: int
@@ -0,0 +1,238 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+import config
+import models
+from utils import mindmap_tree
+
+# Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+# Matching mind-map nodes listed per course
+MAX_NODES_PER_COURSE = 5
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or the to unit with its their this that "
+    "introduction basic basics concepts".split()
+)
+
+
+def _stem(word: str) -> str:
+    # Light suffix folding so "hashing"/"hashes"/"hash" and "normalisation"/"normalization" meet
+    word = word.replace("isation", "ization")
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "shes", "ches", "xes")):
+        return word[:-2]
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 4 and word.endswith("ed"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [_stem(w) for w in _TOKEN.findall((text or "").lower()) if w not in _STOP_WORDS and len(w) > 1]
+
+
+class NodeEntry(NamedTuple):
+    map_id: int
+    path: str
+    name: str
+    terms: frozenset
+
+
+class CourseDoc(NamedTuple):
+    code: str
+    title: str
+    terms: Counter
+    length: int
+    nodes: List[NodeEntry]
+
+
+class ConceptIndex:
+    """
+    BM25 inverted index with one document per active course: its title (counted twice),
+    syllabus and the node names of its linked mind map. Courses can be replaced or removed
+    one at a time, so edits do not rebuild the whole index.
+    """
+
+    def __init__(self):
+        self.docs: Dict[int, CourseDoc] = {}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+
+    def remove(self, course_id: int) -> None:
+        doc = self.docs.pop(course_id, None)
+        if doc is None:
+            return
+        for term in doc.terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(course_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= doc.length
+
+    def add(self, course_id: int, code: str, title: str, syllabus: Optional[str], nodes: List[NodeEntry]) -> None:
+        self.remove(course_id)
+        title_terms = tokenize(title)
+        terms = Counter(title_terms * 2 + tokenize(code) + tokenize(syllabus))
+        for node in nodes:
+            terms.update(node.terms)
+        length = sum(terms.values())
+        self.docs[course_id] = CourseDoc(code, title, terms, length, nodes)
+        for term, tf in terms.items():
+            self.postings[term][course_id] = tf
+        self.total_length += length
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.docs:
+            return []
+
+        n = len(self.docs)
+        avg_length = self.total_length / n if n else 0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for course_id, tf in postings.items():
+                norm = K1 * (1 - B + B * self.docs[course_id].length / avg_length) if avg_length else K1
+                scores[course_id] += idf * tf * (K1 + 1) / (tf + norm)
+
+        query_terms = set(terms)
+        results = []
+        for course_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]:
+            doc = self.docs[course_id]
+            nodes = sorted(
+                (node for node in doc.nodes if node.terms & query_terms),
+                key=lambda node: (-len(node.terms & query_terms), node.path.count("."), node.path),
+            )[:MAX_NODES_PER_COURSE]
+            results.append({
+                "course_id": course_id,
+                "code": doc.code,
+                "title": doc.title,
+                "score": round(score, 4),
+                "nodes": [{"map_id": node.map_id, "path": node.path, "name": node.name} for node in nodes],
+            })
+        return results
+
+
+def _course_nodes(db: Session, map_ids: Iterable[int]) -> Dict[int, List[NodeEntry]]:
+    """map_id -> its non-root nodes, from mindmap_nodes or, for maps stored before it existed, their JSON."""
+    map_ids = set(map_ids)
+    nodes: Dict[int, List[NodeEntry]] = defaultdict(list)
+    if not map_ids:
+        return nodes
+
+    rows = db.query(
+        models.MindMapTreeNode.map_id, models.MindMapTreeNode.path, models.MindMapTreeNode.name
+    ).filter(models.MindMapTreeNode.map_id.in_(map_ids), models.MindMapTreeNode.path != "").all()
+    for map_id, path, name in rows:
+        nodes[map_id].append(NodeEntry(map_id, path, name, frozenset(tokenize(name))))
+
+    missing = map_ids - set(nodes)
+    if missing:
+        for map_id, data in db.query(models.MindMap.id, models.MindMap.data).filter(models.MindMap.id.in_(missing)):
+            for row in mindmap_tree.flatten(data or {}):
+                if row["path"]:
+                    nodes[map_id].append(NodeEntry(map_id, row["path"], row["name"], frozenset(tokenize(row["name"]))))
+    return nodes
+
+
+def _load_courses(db: Session, index: ConceptIndex, course_ids: Optional[List[int]] = None) -> None:
+    query = db.query(
+        models.Course.id, models.Course.code, models.Course.title,
+        models.Course.syllabus_text, models.Course.mindmap_id, models.Course.is_active,
+    )
+    if course_ids is not None:
+        query = query.filter(models.Course.id.in_(course_ids))
+    rows = query.all()
+
+    nodes = _course_nodes(db, [row.mindmap_id for row in rows if row.mindmap_id and row.is_active is not False])
+    seen = set()
+    for course_id, code, title, syllabus, mindmap_id, is_active in rows:
+        seen.add(course_id)
+        if is_active is False:
+            index.remove(course_id)
+        else:
+            index.add(course_id, code, title, syllabus, nodes.get(mindmap_id, []) if mindmap_id else [])
+    # Deleted courses
+    for course_id in set(course_ids or ()) - seen:
+        index.remove(course_id)
+
+
+def build_index(db: Session) -> ConceptIndex:
+    """Indexes every active course: one query for courses, one for their map nodes."""
+    index = ConceptIndex()
+    _load_courses(db, index)
+    return index
+
+
+# This worker's index and when it was built
+_index: Optional[ConceptIndex] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_index(db: Session) -> ConceptIndex:
+    """
+    This worker's index, built on first use and again once it is older than
+    CONCEPT_SEARCH_TTL_SECONDS (bounds staleness from edits made in other workers).
+    """
+    global _index, _loaded_at
+    if _index is not None and time.monotonic() - _loaded_at < config.CONCEPT_SEARCH_TTL_SECONDS:
+        return _index
+
+    with _lock:
+        if _index is not None and time.monotonic() - _loaded_at < config.CONCEPT_SEARCH_TTL_SECONDS:
+            return _index
+        _index = build_index(db)
+        _loaded_at = time.monotonic()
+        return _index
+
+
+def search(db: Session, query: str, limit: int = 10) -> List[Dict]:
+    index = get_index(db)
+    with _lock:
+        return index.search(query, limit)
+
+
+def update_courses(db: Session, course_ids: List[int]) -> None:
+    """Re-indexes the given courses after an edit; a no-op if this worker holds no index yet."""
+    if _index is None:
+        return
+    with _lock:
+        _load_courses(db, _index, list(course_ids))
+
+
+def update_courses_safely(course_ids: List[int]) -> None:
+    """Background-task wrapper with its own session."""
+    from db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        update_courses(db, course_ids)
+    except Exception as e:
+        print(f"Concept Search Update Error: {e}")
+    finally:
+        db.close()
+
+
+def invalidate() -> None:
+    """Drops the index so the next search rebuilds it (after bulk relinking)."""
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,167 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+import models
+
+# Rows per INSERT / IN (...) list. Keeps statements well below MySQL's
+# max_allowed_packet even for 100k-student batches.
+CHUNK_SIZE = 1000
+
+STATUS_PENDING = "PENDING"
+STATUS_SUCCESS = "SUCCESS"
+STATUS_FAILED = "FAILED"
+
+
+def _chunks(seq: List[Any], size: int = CHUNK_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def new_batch_id(prefix: str = "BATCH") -> str:
+    """Returns a batch id such as BATCH_20250101_1A2B3C4D."""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d')}_{uuid.uuid4().hex[:8].upper()}"
+
+
+def create_batch(
+    db: Session,
+    batch_id: str,
+    items: List[Dict[str, Any]],
+    kind: str = "DISPATCH",
+    app_id: Optional[str] = None,
+    exam_id: Optional[int] = None,
+    total_requested: Optional[int] = None,
+) -> models.DispatchBatch:
+    """
+    Persists a batch and its per-student rows in bulk.
+    Each item is a dict with roll_number, branch and optionally status, error, payload.
+    """
+    batch = models.DispatchBatch(
+        id=batch_id,
+        kind=kind,
+        app_id=app_id,
+        exam_id=exam_id,
+        total_requested=len(items) if total_requested is None else total_requested,
+    )
+    db.add(batch)
+    db.flush()
+
+    rows = [
+        {
+            "batch_id": batch_id,
+            "roll_number": str(item.get("roll_number") or "N/A"),
+            "branch": item.get("branch") or "General",
+            "status": item.get("status", STATUS_PENDING),
+            "error": item.get("error"),
+            "payload": item.get("payload"),
+        }
+        for item in items
+    ]
+    for chunk in _chunks(rows):
+        db.execute(insert(models.DispatchItem), chunk)
+    db.commit()
+    return batch
+
+
+def get_batch(db: Session, batch_id: str) -> Optional[models.DispatchBatch]:
+    return db.query(models.DispatchBatch).filter(models.DispatchBatch.id == batch_id).first()
+
+
+def get_work_items(db: Session, batch_id: str, status: str = STATUS_PENDING) -> List[Tuple[int, Dict[str, Any]]]:
+    """Returns (item_id, original assignment) pairs for rows of a batch in the given status."""
+    rows = db.query(models.DispatchItem.id, models.DispatchItem.payload).filter(
+        models.DispatchItem.batch_id == batch_id,
+        models.DispatchItem.status == status,
+    ).order_by(models.DispatchItem.id).all()
+    return [(item_id, payload or {}) for item_id, payload in rows]
+
+
+def record_results(db: Session, results: List[Tuple[int, str, Optional[str]]]) -> None:
+    """
+    Applies (item_id, status, error) results.
+    Results sharing a status and error are written with one UPDATE per chunk.
+    """
+    grouped = defaultdict(list)
+    for item_id, status, error in results:
+        grouped[(status, error)].append(item_id)
+
+    for (status, error), item_ids in grouped.items():
+        for chunk in _chunks(item_ids):
+            db.execute(
+                update(models.DispatchItem)
+                .where(models.DispatchItem.id.in_(chunk))
+                .values(status=status, error=error)
+            )
+    db.commit()
+
+
+def get_status_counts(db: Session, batch_id: str) -> Dict[str, int]:
+    rows = db.query(models.DispatchItem.status, func.count(models.DispatchItem.id)).filter(
+        models.DispatchItem.batch_id == batch_id
+    ).group_by(models.DispatchItem.status).all()
+    return {status: count for status, count in rows}
+
+
+def seconds_since_update(db: Session, batch_id: str) -> Optional[float]:
+    """Seconds since any row of the batch last changed, measured on the database clock."""
+    last_update, now = db.query(func.max(models.DispatchItem.updated_at), func.now()).filter(
+        models.DispatchItem.batch_id == batch_id
+    ).one()
+    if last_update is None or now is None:
+        return None
+    return (now.replace(tzinfo=None) - last_update.replace(tzinfo=None)).total_seconds()
+
+
+def get_summary(db: Session, batch: models.DispatchBatch) -> Dict[str, Any]:
+    counts = get_status_counts(db, batch.id)
+    summary = {
+        "total_requested": batch.total_requested,
+        "success_count": counts.get(STATUS_SUCCESS, 0),
+        "failure_count": counts.get(STATUS_FAILED, 0),
+        "pending_count": counts.get(STATUS_PENDING, 0),
+    }
+    if batch.kind == "UPLOAD":
+        summary["total_files"] = batch.total_requested
+    return summary
+
+
+def get_branch_counts(db: Session, batch_id: str) -> Dict[str, Dict[str, int]]:
+    """Branch -> {"success": n, "failure": n} computed with a single GROUP BY."""
+    rows = db.query(
+        models.DispatchItem.branch, models.DispatchItem.status, func.count(models.DispatchItem.id)
+    ).filter(
+        models.DispatchItem.batch_id == batch_id,
+        models.DispatchItem.status.in_([STATUS_SUCCESS, STATUS_FAILED]),
+    ).group_by(models.DispatchItem.branch, models.DispatchItem.status).all()
+
+    branch_counts = {}
+    for branch, status, count in rows:
+        entry = branch_counts.setdefault(branch, {"success": 0, "failure": 0})
+        entry["success" if status == STATUS_SUCCESS else "failure"] += count
+    return branch_counts
+
+
+def get_branch_rollup(db: Session, batch_id: str) -> Dict[str, Dict[str, list]]:
+    """Branch -> successful rolls and failed rolls with reasons, for finished rows only."""
+    rows = db.query(
+        models.DispatchItem.branch,
+        models.DispatchItem.roll_number,
+        models.DispatchItem.status,
+        models.DispatchItem.error,
+    ).filter(
+        models.DispatchItem.batch_id == batch_id,
+        models.DispatchItem.status.in_([STATUS_SUCCESS, STATUS_FAILED]),
+    ).order_by(models.DispatchItem.id).yield_per(CHUNK_SIZE)
+
+    branch_map = {}
+    for branch, roll_number, status, error in rows:
+        entry = branch_map.setdefault(branch, {"success": [], "failed": []})
+        if status == STATUS_SUCCESS:
+            entry["success"].append(roll_number)
+        else:
+            entry["failed"].append({"roll": roll_number, "reason": error})
+    return branch_map
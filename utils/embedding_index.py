@@ -0,0 +1,227 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+import numpy as np
+
+import config
+
+# Snapshot layout under EMBEDDING_INDEX_DIR: CURRENT names the live snapshot; each
+# snapshot holds the full model (for incremental training) and the KeyedVectors
+# with a separate .npy that workers memory-map. Writers publish a new snapshot
+# and swap CURRENT, so readers never see a half-written index. Writers in any
+# process serialise on an flock of LOCK_FILE.
+MODEL_FILE = "model"
+VECTORS_FILE = "vectors"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+
+# Seconds between checks of CURRENT for a snapshot published by another worker
+RELOAD_CHECK_SECONDS = 30
+
+_vectors = None
+_vectors_snapshot = None
+_checked_at = 0.0
+_read_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def _current_snapshot() -> Optional[str]:
+    try:
+        with open(os.path.join(config.EMBEDDING_INDEX_DIR, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _writer_lock():
+    """Held from loading the live model to publishing its successor, across processes."""
+    os.makedirs(config.EMBEDDING_INDEX_DIR, exist_ok=True)
+    with _write_lock, open(os.path.join(config.EMBEDDING_INDEX_DIR, LOCK_FILE), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _publish(model) -> str:
+    """
+    Saves model + mmap-able vectors as a new snapshot, points CURRENT at it and prunes old ones.
+    Call with _writer_lock held.
+    """
+    base = config.EMBEDDING_INDEX_DIR
+    snapshot = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    path = os.path.join(base, snapshot)
+    os.makedirs(path, exist_ok=True)
+
+    model.save(os.path.join(path, MODEL_FILE))
+    model.wv.save(os.path.join(path, VECTORS_FILE), separately=["vectors"])
+
+    previous = _current_snapshot()
+    tmp = os.path.join(base, f"{CURRENT_FILE}.{snapshot}.tmp")
+    with open(tmp, "w") as f:
+        f.write(snapshot)
+    os.replace(tmp, os.path.join(base, CURRENT_FILE))
+
+    # Keep the previous snapshot (other workers may still have it mapped) and anything not older than it
+    previous_path = os.path.join(base, previous) if previous else None
+    if previous_path is None or not os.path.isdir(previous_path):
+        return snapshot
+    cutoff = os.path.getmtime(previous_path)
+    for name in os.listdir(base):
+        full = os.path.join(base, name)
+        if name in (snapshot, previous) or not os.path.isdir(full):
+            continue
+        if os.path.getmtime(full) < cutoff:
+            shutil.rmtree(full, ignore_errors=True)
+    return snapshot
+
+
+def corpus_sentences(texts: Iterable[str]) -> List[List[str]]:
+    # Same tokens the generator looks up, so every concept it extracts has a vector
+    from utils.mind_map_generator import preprocess_text
+
+    sentences = []
+    for text in texts:
+        if text:
+            sentences.extend(preprocess_text(text, persist=True))
+    return sentences
+
+
+def _syllabus_texts(db) -> List[str]:
+    import models
+
+    return [text for (text,) in db.query(models.Course.syllabus_text).filter(
+        models.Course.syllabus_text.isnot(None)
+    ).all()]
+
+
+def _train(sentences: List[List[str]]):
+    from gensim.models import Word2Vec
+
+    # min_count=1: every syllabus term must have a vector for the maps built from it
+    return Word2Vec(
+        sentences=sentences,
+        vector_size=config.EMBEDDING_VECTOR_SIZE,
+        window=5,
+        min_count=1,
+        epochs=config.EMBEDDING_EPOCHS,
+        workers=4,
+    )
+
+
+def build_index(db) -> Optional[str]:
+    """Trains a fresh model over all syllabi and publishes it. Returns the snapshot name."""
+    with _writer_lock():
+        sentences = corpus_sentences(_syllabus_texts(db))
+        if not sentences:
+            return None
+        return _publish(_train(sentences))
+
+
+def update_index(texts: Iterable[str]) -> Optional[str]:
+    """
+    Continues training the live model on new or edited syllabi, adding their vocabulary.
+    Builds the index from scratch if none exists yet.
+    """
+    from gensim.models import Word2Vec
+
+    sentences = corpus_sentences(texts)
+    if not sentences:
+        return None
+
+    with _writer_lock():
+        snapshot = _current_snapshot()
+        if snapshot is None:
+            from db import SessionLocal
+            db = SessionLocal()
+            try:
+                sentences = corpus_sentences(_syllabus_texts(db))
+            finally:
+                db.close()
+            model = _train(sentences)
+        else:
+            model = Word2Vec.load(os.path.join(config.EMBEDDING_INDEX_DIR, snapshot, MODEL_FILE))
+            model.build_vocab(sentences, update=True)
+            model.train(sentences, total_examples=len(sentences), epochs=model.epochs)
+        return _publish(model)
+
+
+def update_index_safely(texts: Iterable[str]) -> None:
+    """Mind-map pool entry point: a failed update leaves the previous snapshot live."""
+    try:
+        update_index(list(texts))
+    except Exception as e:
+        print(f"Embedding Index Update Error: {e}")
+
+
+def get_vectors():
+    """
+    The live KeyedVectors, memory-mapped read-only so workers share pages.
+    Returns None when no index has been built (callers fall back to per-document training).
+    """
+    global _vectors, _vectors_snapshot, _checked_at
+    now = time.monotonic()
+    if _vectors is not None and now - _checked_at < RELOAD_CHECK_SECONDS:
+        return _vectors
+
+    with _read_lock:
+        _checked_at = now
+        snapshot = _current_snapshot()
+        if snapshot is None or snapshot == _vectors_snapshot:
+            return _vectors
+        try:
+            from gensim.models import KeyedVectors
+            _vectors = KeyedVectors.load(os.path.join(config.EMBEDDING_INDEX_DIR, snapshot, VECTORS_FILE), mmap="r")
+            _vectors_snapshot = snapshot
+        except Exception as e:
+            print(f"Embedding Index Load Error: {e}")
+        return _vectors
+
+
+class DocumentNeighbours:
+    """
+    Nearest neighbours of a word among one document's vocabulary, using the corpus vectors.
+    Offers the `in` / most_similar interface of gensim KeyedVectors used by find_related_terms.
+    """
+
+    def __init__(self, vectors, processed_sentences: List[List[str]]):
+        self.vectors = vectors
+        vocab = {word for sentence in processed_sentences for word in sentence}
+        self.words = sorted(w for w in vocab if w in vectors.key_to_index)
+        self._positions = {w: i for i, w in enumerate(self.words)}
+        if self.words:
+            matrix = vectors[self.words]
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.matrix = matrix / np.where(norms == 0, 1, norms)
+        else:
+            self.matrix = np.zeros((0, vectors.vector_size), dtype=np.float32)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._positions
+
+    def most_similar(self, word: str, topn: int = 10):
+        position = self._positions.get(word)
+        if position is None:
+            raise KeyError(word)
+        scores = self.matrix @ self.matrix[position]
+        scores[position] = -np.inf
+        topn = min(topn, len(self.words) - 1)
+        if topn <= 0:
+            return []
+        best = np.argpartition(-scores, topn - 1)[:topn]
+        best = best[np.argsort(-scores[best])]
+        return [(self.words[i], float(scores[i])) for i in best]
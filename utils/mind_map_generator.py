@@ -1,30 +1,108 @@
+import hashlib
 import json
-import networkx as nx
-from collections import defaultdict
+import os
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+from types import SimpleNamespace
+
 import numpy as np
 
-# Try importing NLP libraries, handle missing deps gracefully
-try:
-    import nltk
-    from nltk.tokenize import sent_tokenize, word_tokenize
-    from nltk.corpus import stopwords
-    from nltk.stem import WordNetLemmatizer
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from gensim.models import Word2Vec
-    
-    # Download necessary NLTK data
+import config
+from utils import embedding_index
+
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+# Root name of a successfully generated map; anything else is an error placeholder
+GENERATED_ROOT = "Course Concepts"
+# Bump when generator output changes, so cached maps are regenerated
+GENERATOR_VERSION = 2
+
+# nltk, scipy and gensim are imported on first use, not at app startup
+_nlp = None
+_nlp_error = None
+_nlp_lock = threading.Lock()
+
+
+def _ensure_nltk_data(nltk):
+    """Points nltk at NLTK_DATA_DIR; downloads missing corpora only if NLTK_AUTO_DOWNLOAD is set."""
+    if config.NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, config.NLTK_DATA_DIR)
+
+    missing = []
+    for name, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(name)
+
+    if missing and config.NLTK_AUTO_DOWNLOAD:
+        for name in missing:
+            nltk.download(name, download_dir=config.NLTK_DATA_DIR, quiet=True)
+    elif missing:
+        print(f"NLTK data missing from {config.NLTK_DATA_DIR}: {', '.join(missing)}")
+
+
+def _load_nlp():
+    """Imports the NLP stack once per process. Returns None if it is not installed."""
+    global _nlp, _nlp_error
+    if _nlp is not None or _nlp_error is not None:
+        return _nlp
+
+    with _nlp_lock:
+        if _nlp is not None or _nlp_error is not None:
+            return _nlp
+        try:
+            import nltk
+            from nltk.tokenize import NLTKWordTokenizer, sent_tokenize
+            from nltk.corpus import stopwords
+            from nltk.stem import WordNetLemmatizer
+            from scipy import sparse
+            from gensim.models import Word2Vec
+        except ImportError as e:
+            _nlp_error = e
+            return None
+
+        try:
+            _ensure_nltk_data(nltk)
+        except Exception as e:
+            print(f"NLTK Data Warning: {e}")
+
+        _nlp = SimpleNamespace(
+            sent_tokenize=sent_tokenize,
+            # word_tokenize's tokenizer without its redundant per-call sentence split
+            word_tokenizer=NLTKWordTokenizer(),
+            stopwords=stopwords,
+            WordNetLemmatizer=WordNetLemmatizer,
+            sparse=sparse,
+            Word2Vec=Word2Vec,
+        )
+        return _nlp
+
+
+def nlp_available():
+    return _load_nlp() is not None
+
+
+def warm_up():
+    """
+    Loads the NLP stack and its corpora ahead of the first request.
+    Returns False if the libraries are not installed.
+    """
+    nlp = _load_nlp()
+    if nlp is None:
+        return False
     try:
-        nltk.download('punkt', quiet=True)
-        nltk.download('punkt_tab', quiet=True)
-        nltk.download('stopwords', quiet=True)
-        nltk.download('wordnet', quiet=True)
-    except Exception as e:
-        print(f"NLTK Download Warning: {e}")
-        pass
-    
-    NLP_AVAILABLE = True
-except ImportError:
-    NLP_AVAILABLE = False
+        # Corpora load lazily in nltk too; touch each one
+        lemmatize_sentences(tokenize_sentences("Warming up."))
+    except LookupError as e:
+        print("NLP Warm-up Warning: NLTK data incomplete, see download_nltk_data.py")
+    return True
 
 class MindMapNode:
     def __init__(self, content):
@@ -34,66 +112,229 @@ class MindMapNode:
         self.link = f"https://www.google.com/search?q={content.replace(' ', '+')}+study+material"
         self.youtube_link = f"https://www.youtube.com/results?search_query={content.replace(' ', '+')}+tutorial"
 
-def preprocess_text(text):
-    sentences = sent_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    lemmatizer = WordNetLemmatizer()
-    
+# Distinct tokens whose lemma is memoised; syllabi share most of their vocabulary
+LEMMA_CACHE_SIZE = 50000
+# Tokens of preprocessed documents kept in memory per process, in front of PREPROCESS_CACHE_DIR
+PROCESSED_MEMO_MAX_TOKENS = 2000000
+# Bump when tokenisation or lemmatisation changes, so cached token files are ignored
+PREPROCESS_VERSION = 1
+
+_stop_words = None
+_lemmatizer = None
+_processed_memo = OrderedDict()  # key -> (processed_sentences, token_count)
+_processed_memo_tokens = 0
+_processed_lock = threading.Lock()
+
+def _token_resources():
+    """Stopword set and lemmatizer, built once per process."""
+    global _stop_words, _lemmatizer
+    if _lemmatizer is None:
+        nlp = _load_nlp()
+        _stop_words = frozenset(nlp.stopwords.words('english'))
+        _lemmatizer = nlp.WordNetLemmatizer()
+    return _stop_words, _lemmatizer
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize_token(word):
+    """Lemma of a lower-cased token, or None if it is dropped (non-alphanumeric, stopword, short)."""
+    if not word.isalnum():
+        return None
+    stop_words, lemmatizer = _token_resources()
+    lemma = lemmatizer.lemmatize(word)
+    return lemma if lemma not in stop_words and len(lemma) > 2 else None
+
+def tokenize_sentences(text):
+    """Lower-cased word tokens of each sentence, tokenised as one batch."""
+    nlp = _load_nlp()
+    sentences = [sentence.lower() for sentence in nlp.sent_tokenize(text)]
+    return nlp.word_tokenizer.tokenize_sents(sentences)
+
+def lemmatize_sentences(tokenized_sentences):
+    """Lemmatised alphanumeric tokens without stopwords or short words; empty sentences are dropped."""
     processed_sentences = []
-    for sentence in sentences:
-        words = word_tokenize(sentence.lower())
-        words = [lemmatizer.lemmatize(word) for word in words if word.isalnum()]
-        words = [word for word in words if word not in stop_words and len(word) > 2]
+    for words in tokenized_sentences:
+        words = [lemma for lemma in map(lemmatize_token, words) if lemma]
         if words:
             processed_sentences.append(words)
-    
+
+    return processed_sentences
+
+def _processed_path(key):
+    return os.path.join(config.PREPROCESS_CACHE_DIR, key[:2], f"{key}.json")
+
+def _load_processed(key):
+    if not config.PREPROCESS_CACHE_DIR:
+        return None
+    try:
+        with open(_processed_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_processed(key, processed_sentences):
+    if not config.PREPROCESS_CACHE_DIR:
+        return
+    path = _processed_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(processed_sentences, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Preprocess Cache Warning: {e}")
+
+def preprocess_text(text, persist=False):
+    """
+    Token lists per sentence, cached by text hash in memory (up to PROCESSED_MEMO_MAX_TOKENS).
+    With persist (syllabus text) they are also kept under PREPROCESS_CACHE_DIR, so a syllabus
+    is tokenised once across workers and runs; one-off uploads are not written to disk.
+    Treat the result as read-only.
+    """
+    global _processed_memo_tokens
+    key = hashlib.sha256(f"v{PREPROCESS_VERSION}\n{text}".encode("utf-8")).hexdigest()
+    with _processed_lock:
+        cached = _processed_memo.get(key)
+        if cached is not None:
+            _processed_memo.move_to_end(key)
+            return cached[0]
+
+    processed_sentences = _load_processed(key) if persist else None
+    if processed_sentences is None:
+        processed_sentences = lemmatize_sentences(tokenize_sentences(text))
+        if persist:
+            _save_processed(key, processed_sentences)
+
+    token_count = sum(len(words) for words in processed_sentences)
+    if token_count > PROCESSED_MEMO_MAX_TOKENS:
+        return processed_sentences
+    with _processed_lock:
+        if key not in _processed_memo:
+            _processed_memo[key] = (processed_sentences, token_count)
+            _processed_memo_tokens += token_count
+        while _processed_memo_tokens > PROCESSED_MEMO_MAX_TOKENS:
+            _, (_, evicted_tokens) = _processed_memo.popitem(last=False)
+            _processed_memo_tokens -= evicted_tokens
     return processed_sentences
 
+# TextRank: co-occurrence window and PageRank settings (networkx defaults)
+WINDOW_SIZE = 5
+DAMPING = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOL = 1.0e-6
+
+def encode_sentences(processed_sentences):
+    """
+    Maps tokens to vocabulary ids (first-appearance order).
+    Returns (vocab, token_ids, sentence_ids) with one array entry per token.
+    """
+    vocab_index = {}
+    token_ids = []
+    sentence_ids = []
+    for s_id, sentence in enumerate(processed_sentences):
+        for word in sentence:
+            token_ids.append(vocab_index.setdefault(word, len(vocab_index)))
+            sentence_ids.append(s_id)
+    vocab = list(vocab_index)
+    return vocab, np.asarray(token_ids, dtype=np.int64), np.asarray(sentence_ids, dtype=np.int64)
+
+def tfidf_scores(token_ids, vocab_size):
+    # Single-document TF-IDF: every idf is 1, so this is the L2-normalised term frequency
+    counts = np.bincount(token_ids, minlength=vocab_size).astype(np.float64)
+    norm = np.linalg.norm(counts)
+    return counts / norm if norm else counts
+
+def cooccurrence_matrix(token_ids, sentence_ids, vocab_size):
+    """Symmetric sparse matrix of co-occurrence counts within WINDOW_SIZE tokens of the same sentence."""
+    sparse = _load_nlp().sparse
+    rows, cols = [], []
+    for offset in range(1, WINDOW_SIZE):
+        a, b = token_ids[:-offset], token_ids[offset:]
+        keep = (sentence_ids[:-offset] == sentence_ids[offset:]) & (a != b)
+        rows.append(a[keep])
+        cols.append(b[keep])
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+    counts = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(vocab_size, vocab_size)).tocsr()
+    return counts + counts.T
+
+def textrank_scores(weights):
+    """
+    Weighted PageRank by power iteration over the words that have co-occurrences,
+    matching networkx.pagerank on the equivalent undirected graph. Others score 0.
+    """
+    sparse = _load_nlp().sparse
+    vocab_size = weights.shape[0]
+    scores = np.zeros(vocab_size)
+    strength = np.asarray(weights.sum(axis=1)).ravel()
+    nodes = np.flatnonzero(strength)
+    n = len(nodes)
+    if n == 0:
+        return scores
+
+    sub = weights[nodes][:, nodes]
+    # Column-stochastic transition matrix: x_next = DAMPING * M @ x + teleport
+    transition = (sub @ sparse.diags(1.0 / strength[nodes])).tocsr()
+    x = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_MAX_ITER):
+        x_next = DAMPING * (transition @ x) + (1.0 - DAMPING) / n
+        converged = np.abs(x_next - x).sum() < n * PAGERANK_TOL
+        x = x_next
+        if converged:
+            break
+    scores[nodes] = x
+    return scores
+
 def extract_key_concepts(processed_sentences, num_concepts=5):
     if not processed_sentences:
         return []
-        
-    # Create a single string for TF-IDF
-    text = ' '.join([' '.join(sentence) for sentence in processed_sentences])
-    
-    # TF-IDF
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([text])
-    feature_names = vectorizer.get_feature_names_out()
-    tfidf_scores = dict(zip(feature_names, tfidf_matrix.toarray()[0]))
-    
-    # TextRank (Simplified Co-occurrence)
-    text_rank = nx.Graph()
-    for sentence in processed_sentences:
-        for i, word1 in enumerate(sentence):
-            for word2 in sentence[i+1:i+5]: # Window size 5
-                if word1 != word2:
-                    if text_rank.has_edge(word1, word2):
-                        text_rank[word1][word2]['weight'] += 1
-                    else:
-                        text_rank.add_edge(word1, word2, weight=1)
-    
-    if len(text_rank.nodes) > 0:
-        scores = nx.pagerank(text_rank)
-    else:
-        scores = {}
-    
+
+    vocab, token_ids, sentence_ids = encode_sentences(processed_sentences)
+    vocab_size = len(vocab)
+
+    tfidf = tfidf_scores(token_ids, vocab_size)
+    rank = textrank_scores(cooccurrence_matrix(token_ids, sentence_ids, vocab_size))
+
     # Combine TF-IDF and TextRank scores
-    combined_scores = {word: (tfidf_scores.get(word, 0) + scores.get(word, 0)) / 2 for word in set(tfidf_scores) | set(scores)}
-    
-    key_concepts = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:num_concepts]
-    return [concept for concept, _ in key_concepts]
+    combined = (tfidf + rank) / 2
+    top = np.argsort(-combined, kind="stable")[:num_concepts]
+    return [vocab[i] for i in top]
 
 def train_word2vec(processed_sentences):
     # min_count=1 ensures even rare words are kept for small texts
-    model = Word2Vec(sentences=processed_sentences, vector_size=100, window=5, min_count=1, workers=4)
+    model = _load_nlp().Word2Vec(sentences=processed_sentences, vector_size=100, window=5, min_count=1, workers=4)
     return model
 
-def find_related_terms(concept, word2vec_model, processed_sentences, num_terms=3):
+class SentenceIndex:
+    """
+    Per-document term -> sentence ids, built once during preprocessing, with the
+    co-occurrence Counter of each term computed on first lookup and reused across
+    every node of the map.
+    """
+    def __init__(self, processed_sentences):
+        self.sentences = processed_sentences
+        self.postings = defaultdict(list)
+        for s_id, sentence in enumerate(processed_sentences):
+            for word in dict.fromkeys(sentence):
+                self.postings[word].append(s_id)
+        self._cooccurrence = {}
+
+    def cooccurrence(self, term):
+        """Counter of words sharing a sentence with term, in first-appearance order."""
+        counts = self._cooccurrence.get(term)
+        if counts is None:
+            counts = Counter()
+            for s_id in self.postings.get(term, ()):
+                counts.update(word for word in self.sentences[s_id] if word != term)
+            self._cooccurrence[term] = counts
+        return counts
+
+def find_related_terms(concept, vectors, sentence_index, num_terms=3):
+    """vectors: corpus DocumentNeighbours or a per-document model's KeyedVectors."""
     related_terms = []
-    if concept in word2vec_model.wv:
+    if concept in vectors:
         try:
-            similar_words = word2vec_model.wv.most_similar(concept, topn=num_terms*3)
+            similar_words = vectors.most_similar(concept, topn=num_terms*3)
             for word, _ in similar_words:
                 if word != concept and word not in related_terms:
                      # Simple check to prefer words that actually appear in context/sentences near the concept could be added here
@@ -105,44 +346,48 @@ def find_related_terms(concept, word2vec_model, processed_sentences, num_terms=3
             
     # Fallback: Frequency co-occurrence
     if len(related_terms) < num_terms:
-        word_freq = defaultdict(int)
-        for sentence in processed_sentences:
-            if concept in sentence:
-                for word in sentence:
-                    if word != concept and word not in related_terms:
-                        word_freq[word] += 1
-        additional_terms = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:num_terms-len(related_terms)]
+        word_freq = [(word, n) for word, n in sentence_index.cooccurrence(concept).items() if word not in related_terms]
+        additional_terms = sorted(word_freq, key=lambda x: x[1], reverse=True)[:num_terms-len(related_terms)]
         related_terms.extend([term for term, _ in additional_terms])
     
     return related_terms[:num_terms]
 
-def build_mind_map(text, depth=2):
-    if not NLP_AVAILABLE:
-        return MindMapNode("Error: NLP libraries (nltk, sklearn, gensim) missing")
-        
-    processed_sentences = preprocess_text(text)
-    if not processed_sentences:
-         return MindMapNode("Insufficient Content")
+def document_vectors(processed_sentences):
+    corpus_vectors = embedding_index.get_vectors()
+    if corpus_vectors is not None:
+        return embedding_index.DocumentNeighbours(corpus_vectors, processed_sentences)
+    # No shared index built yet: train on this document alone
+    return train_word2vec(processed_sentences).wv
 
-    key_concepts = extract_key_concepts(processed_sentences, num_concepts=4) # Top 4 main branches
-    word2vec_model = train_word2vec(processed_sentences)
-    
+def build_tree(key_concepts, vectors, sentence_index, depth=2):
     def create_node(concept, current_depth):
         node = MindMapNode(concept.capitalize())
         if current_depth < depth:
-            related_terms = find_related_terms(concept, word2vec_model, processed_sentences, num_terms=3)
+            related_terms = find_related_terms(concept, vectors, sentence_index, num_terms=3)
             for term in related_terms:
                 unique_lower_children = [child.content.lower() for child in node.children]
                 if term.lower() not in unique_lower_children:
                     node.children.append(create_node(term, current_depth + 1))
         return node
 
-    root = MindMapNode("Course Concepts") # Generic Root
+    root = MindMapNode(GENERATED_ROOT) # Generic Root
     for concept in key_concepts:
         root.children.append(create_node(concept, 0))
     
     return root
 
+def build_mind_map(text, depth=2, persist=False):
+    if not nlp_available():
+        return MindMapNode("Error: NLP libraries (nltk, scipy, gensim) missing")
+        
+    processed_sentences = preprocess_text(text, persist=persist)
+    if not processed_sentences:
+         return MindMapNode("Insufficient Content")
+
+    key_concepts = extract_key_concepts(processed_sentences, num_concepts=4) # Top 4 main branches
+    vectors = document_vectors(processed_sentences)
+    return build_tree(key_concepts, vectors, SentenceIndex(processed_sentences), depth)
+
 def mind_map_to_dict(node):
     return {
         "name": node.content,
@@ -151,18 +396,19 @@ def mind_map_to_dict(node):
         "children": [mind_map_to_dict(child) for child in node.children]
     }
 
-def generate_mind_map_json(text, depth=2):
+def generate_mind_map_json(text, depth=2, persist=False):
     """
     Generates JSON mind map using NLP (No AI API).
+    persist: text is a syllabus, so its preprocessing is worth caching on disk.
     """
-    if not NLP_AVAILABLE:
+    if not nlp_available():
         return {
             "name": "Installation Required", 
-            "children": [{"name": "Please install: nltk scikit-learn gensim networkx"}]
+            "children": [{"name": "Please install: nltk scipy gensim"}]
         }
         
     try:
-        mind_map = build_mind_map(text, depth)
+        mind_map = build_mind_map(text, depth, persist=persist)
         return mind_map_to_dict(mind_map)
     except Exception as e:
         print(f"NLP Gen Error: {e}")
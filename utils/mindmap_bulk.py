@@ -0,0 +1,165 @@
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session
+
+import models
+from utils import mindmap_cache, mindmap_jobs, mindmap_tree
+from utils.mind_map_generator import GENERATED_ROOT, generate_mind_map_json
+
+# Keys per IN (...) list / CASE statement
+CHUNK_SIZE = 500
+
+
+def _chunks(seq: List[Any], size: int = CHUNK_SIZE):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _load_entries(db: Session, keys: List[str]) -> Dict[str, tuple]:
+    """content_hash -> (entry_id, mindmap_id or None if that map no longer exists)."""
+    entries = {}
+    for chunk in _chunks(keys):
+        rows = db.query(
+            models.MindMapCache.content_hash, models.MindMapCache.id, models.MindMap.id
+        ).outerjoin(
+            models.MindMap, models.MindMapCache.mindmap_id == models.MindMap.id
+        ).filter(models.MindMapCache.content_hash.in_(chunk)).all()
+        entries.update({key: (entry_id, map_id) for key, entry_id, map_id in rows})
+    return entries
+
+
+def generate_for_courses(
+    db: Session,
+    user_id: int,
+    course_ids: Optional[List[int]] = None,
+    force: bool = False,
+    depth: int = 2,
+) -> Dict[str, Any]:
+    """
+    Generates and links syllabus maps for every course whose map is missing or stale
+    (its syllabus or the generator changed since). Identical syllabi share one map.
+    Generation runs across the mind-map process pool; maps and cache rows are
+    written in bulk and courses are relinked with one CASE UPDATE per CHUNK_SIZE.
+    Returns counts and throughput.
+    """
+    started = time.perf_counter()
+    query = db.query(
+        models.Course.id, models.Course.title, models.Course.syllabus_text, models.Course.mindmap_id
+    ).filter(models.Course.syllabus_text.isnot(None), models.Course.syllabus_text != "")
+    if course_ids:
+        query = query.filter(models.Course.id.in_(course_ids))
+    courses = query.all()
+
+    keys = {course_id: mindmap_cache.content_key(text, depth) for course_id, _, text, _ in courses}
+    entries = _load_entries(db, list(set(keys.values())))
+
+    up_to_date = 0
+    stale = []
+    for course_id, title, text, mindmap_id in courses:
+        entry = entries.get(keys[course_id])
+        if not force and mindmap_id and entry and entry[1] == mindmap_id:
+            up_to_date += 1
+        else:
+            stale.append((course_id, title, text))
+
+    # One map per distinct content; only content with no cached data is generated
+    by_key: Dict[str, Dict[str, Any]] = {}
+    for course_id, title, text in stale:
+        group = by_key.setdefault(keys[course_id], {"title": title, "text": text, "courses": []})
+        group["courses"].append(course_id)
+
+    to_generate, link_only, from_cache = [], {}, []
+    for key in by_key:
+        if force or key not in entries:
+            to_generate.append(key)
+        elif entries[key][1]:
+            link_only[key] = entries[key][1]
+        else:
+            from_cache.append(key)
+
+    generation_started = time.perf_counter()
+    results = []
+    if to_generate:
+        texts = [by_key[key]["text"] for key in to_generate]
+        results = list(mindmap_jobs.get_executor().map(
+            generate_mind_map_json, texts, [depth] * len(texts), [True] * len(texts), chunksize=max(1, len(texts) // 32)
+        ))
+    generation_seconds = time.perf_counter() - generation_started
+
+    generated, failed = {}, []
+    for key, data in zip(to_generate, results):
+        if data.get("name") == GENERATED_ROOT:
+            generated[key] = data
+        else:
+            failed.extend({"course_id": cid, "reason": data.get("name")} for cid in by_key[key]["courses"])
+
+    # Cache rows: insert new content, refresh data regenerated under force
+    new_entries = [
+        {"content_hash": key, "params": mindmap_cache.params_for(depth), "data": data}
+        for key, data in generated.items() if key not in entries
+    ]
+    for chunk in _chunks(new_entries):
+        db.execute(insert(models.MindMapCache), chunk)
+    for key, data in generated.items():
+        if key in entries:
+            db.execute(update(models.MindMapCache).where(models.MindMapCache.content_hash == key).values(data=data))
+
+    # Content regenerated under force keeps its shared map, rewritten in place
+    replaced = {key: entries[key][1] for key in generated if key in entries and entries[key][1]}
+    for key, map_id in replaced.items():
+        db.execute(update(models.MindMap).where(models.MindMap.id == map_id).values(data=generated[key], content_hash=key))
+    mindmap_tree.replace_nodes(db, {map_id: generated[key] for key, map_id in replaced.items()})
+
+    # Cached content whose shared map was deleted gets a new map from the cached data
+    needs_map = {key: data for key, data in generated.items() if key not in replaced}
+    for chunk in _chunks(from_cache):
+        needs_map.update(db.query(models.MindMapCache.content_hash, models.MindMapCache.data).filter(
+            models.MindMapCache.content_hash.in_(chunk)
+        ).all())
+
+    new_maps = {
+        key: models.MindMap(
+            user_id=user_id, title=f"{by_key[key]['title']} - Syllabus Map", data=data, content_hash=key
+        )
+        for key, data in needs_map.items()
+    }
+    db.add_all(new_maps.values())
+    db.flush()
+    map_ids = {key: m.id for key, m in new_maps.items()}
+    mindmap_tree.store_nodes(db, {m.id: m.data for m in new_maps.values()})
+
+    for chunk in _chunks(list(map_ids.items())):
+        db.execute(
+            update(models.MindMapCache)
+            .where(models.MindMapCache.content_hash.in_([key for key, _ in chunk]))
+            .values(mindmap_id=case(dict(chunk), value=models.MindMapCache.content_hash))
+        )
+
+    links = {**link_only, **replaced, **map_ids}
+    course_links = [
+        (course_id, links[key])
+        for key, group in by_key.items() if key in links
+        for course_id in group["courses"]
+    ]
+    for chunk in _chunks(course_links):
+        db.execute(
+            update(models.Course)
+            .where(models.Course.id.in_([course_id for course_id, _ in chunk]))
+            .values(mindmap_id=case(dict(chunk), value=models.Course.id))
+        )
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "courses_considered": len(courses),
+        "up_to_date": up_to_date,
+        "courses_linked": len(course_links),
+        "maps_generated": len(generated),
+        "maps_reused": len(link_only),
+        "failed": failed,
+        "generation_seconds": round(generation_seconds, 2),
+        "elapsed_seconds": round(elapsed, 2),
+        "maps_per_second": round(len(to_generate) / generation_seconds, 2) if generation_seconds and to_generate else None,
+    }
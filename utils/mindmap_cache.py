@@ -0,0 +1,107 @@
+import hashlib
+import re
+from typing import Callable, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from utils import mindmap_tree
+from utils.mind_map_generator import GENERATED_ROOT, GENERATOR_VERSION, generate_mind_map_json
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalise_text(text: str) -> str:
+    """Whitespace-insensitive form of a document; PDF extraction and editors vary only in spacing."""
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def params_for(depth: int) -> str:
+    return f"depth={depth};v={GENERATOR_VERSION}"
+
+
+def content_key(text: str, depth: int = 2) -> str:
+    payload = f"{params_for(depth)}\n{normalise_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup(db: Session, key: str) -> Optional[models.MindMapCache]:
+    return db.query(models.MindMapCache).filter(models.MindMapCache.content_hash == key).first()
+
+
+def find(db: Session, text: str, depth: int = 2) -> Optional[models.MindMapCache]:
+    """Cached entry for this content; None on a miss. Read-only, so hits cost no write."""
+    return lookup(db, content_key(text, depth))
+
+
+def store(db: Session, text: str, depth: int, data) -> Optional[models.MindMapCache]:
+    """
+    Caches a freshly generated map. Error placeholders are never cached,
+    so they are retried next time; None is returned for them.
+    """
+    if data.get("name") != GENERATED_ROOT:
+        return None
+
+    key = content_key(text, depth)
+    entry = models.MindMapCache(content_hash=key, params=params_for(depth), data=data)
+    db.add(entry)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request generated the same content first
+        db.rollback()
+        entry = lookup(db, key)
+    return entry
+
+
+def get_or_generate(db: Session, text: str, depth: int = 2, generate: Callable = generate_mind_map_json):
+    """Returns (cache_entry, data). Runs generate(text, depth) only on a miss."""
+    entry = find(db, text, depth)
+    if entry:
+        return entry, entry.data
+
+    data = generate(text, depth)
+    return store(db, text, depth, data), data
+
+
+def shared_map(
+    db: Session,
+    entry: Optional[models.MindMapCache],
+    data,
+    user_id: int,
+    title: str,
+    user_scoped: bool = False,
+) -> models.MindMap:
+    """
+    The MindMap row for a cache entry, created on first use so identical content is stored once.
+    With user_scoped the shared row is only reused if the user owns it, so uploads still
+    appear under each uploader's maps. Without an entry (generation failed) a standalone row is created.
+    """
+    existing = None
+    if entry and entry.mindmap_id:
+        existing = db.query(models.MindMap).filter(models.MindMap.id == entry.mindmap_id).first()
+        if existing and (not user_scoped or existing.user_id == user_id):
+            return existing
+
+    if entry and user_scoped:
+        # The user's own copy from an earlier upload of the same file
+        own = db.query(models.MindMap).filter(
+            models.MindMap.user_id == user_id,
+            models.MindMap.title == title,
+            models.MindMap.content_hash == entry.content_hash,
+        ).first()
+        if own:
+            return own
+
+    new_map = models.MindMap(
+        user_id=user_id, title=title, data=data, content_hash=entry.content_hash if entry else None
+    )
+    db.add(new_map)
+    db.flush()
+    mindmap_tree.store_nodes(db, {new_map.id: data})
+    if entry and not existing:
+        entry.mindmap_id = new_map.id
+    db.commit()
+    db.refresh(new_map)
+    return new_map
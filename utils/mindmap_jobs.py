@@ -0,0 +1,176 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+import config
+import models
+from db import SessionLocal
+from utils import embedding_index, mind_map_generator, mindmap_cache
+from utils.pdf_utils import count_pdf_pages, extract_pdf_pages
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _init_worker():
+    # Pay the nltk/scipy/gensim import once per worker, not once per job
+    mind_map_generator.warm_up()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Shared mind-map pool: PDF extraction and NLP run here, never on the event loop.
+    Its size caps concurrent generations; further jobs queue. 'spawn' avoids forking DB connections.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, config.MINDMAP_WORKERS),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def generate_blocking(text: str, depth: int = 2, persist: bool = False):
+    """For sync (threadpool) endpoints: runs generation in the pool and waits for it."""
+    return get_executor().submit(mind_map_generator.generate_mind_map_json, text, depth, persist).result()
+
+
+async def update_embedding_index(texts: List[str]) -> None:
+    """Continues training the shared embedding index on new syllabi in the pool, off the web worker."""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(get_executor(), embedding_index.update_index_safely, list(texts))
+    except Exception as e:
+        print(f"Embedding Index Update Error: {e}")
+
+
+def create_job(db, user_id: int, title: str) -> models.MindMapJob:
+    job = models.MindMapJob(user_id=user_id, title=title, status=STATUS_PENDING)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _update_job(job_id: int, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.MindMapJob).filter(models.MindMapJob.id == job_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _find_cached(text: str, depth: int):
+    db = SessionLocal()
+    try:
+        entry = mindmap_cache.find(db, text, depth)
+        return (entry.id, entry.data) if entry else (None, None)
+    finally:
+        db.close()
+
+
+def _save_result(user_id: int, title: str, text: str, depth: int, data, entry_id: Optional[int]) -> int:
+    db = SessionLocal()
+    try:
+        if entry_id is not None:
+            entry = db.get(models.MindMapCache, entry_id)
+        else:
+            entry = mindmap_cache.store(db, text, depth, data)
+        mind_map = mindmap_cache.shared_map(db, entry, data, user_id, title, user_scoped=True)
+        return mind_map.id
+    finally:
+        db.close()
+
+
+async def extract_text_parallel(pdf_path: str) -> str:
+    """
+    Extracts up to PDF_MAX_PAGES pages in PDF_PAGES_PER_CHUNK-page chunks across the pool,
+    joining chunks in page order and cancelling the rest once PDF_MAX_CHARS is reached.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    max_chars = config.PDF_MAX_CHARS
+    pages = min(await asyncio.to_thread(count_pdf_pages, pdf_path), config.PDF_MAX_PAGES)
+    step = max(1, config.PDF_PAGES_PER_CHUNK)
+
+    chunks = [
+        loop.run_in_executor(executor, extract_pdf_pages, pdf_path, start, min(start + step, pages), max_chars)
+        for start in range(0, pages, step)
+    ]
+    parts, total = [], 0
+    try:
+        for chunk in chunks:
+            text = await chunk
+            parts.append(text)
+            total += len(text)
+            if total >= max_chars:
+                break
+    finally:
+        for chunk in chunks:
+            chunk.cancel()
+    return "".join(parts)[:max_chars]
+
+
+async def run_upload_job(job_id: int, user_id: int, title: str, pdf_path: str, depth: int = 2) -> None:
+    """
+    Extracts the uploaded PDF and generates its map in the process pool, reusing the
+    content cache, and records the outcome on the job row. Removes pdf_path when done.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        await asyncio.to_thread(_update_job, job_id, status=STATUS_RUNNING)
+
+        text = await extract_text_parallel(pdf_path)
+        if not text:
+            raise ValueError("Could not extract text from PDF")
+
+        entry_id, data = await asyncio.to_thread(_find_cached, text, depth)
+        if entry_id is None:
+            data = await loop.run_in_executor(executor, mind_map_generator.generate_mind_map_json, text, depth)
+
+        mindmap_id = await asyncio.to_thread(_save_result, user_id, title, text, depth, data, entry_id)
+        await asyncio.to_thread(
+            _update_job, job_id, status=STATUS_COMPLETED, mindmap_id=mindmap_id, completed_at=datetime.utcnow()
+        )
+    except Exception as e:
+        print(f"MindMap Job {job_id} Error: {e}")
+        await asyncio.to_thread(
+            _update_job, job_id, status=STATUS_FAILED, error=str(e), completed_at=datetime.utcnow()
+        )
+    finally:
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+
+def run_bulk_job(job_id: int, user_id: int, course_ids: Optional[List[int]] = None, force: bool = False) -> None:
+    """
+    Runs a bulk course-map generation (see mindmap_bulk.generate_for_courses) with its
+    own session and records its report on the job row. Sync: runs in the threadpool.
+    """
+    # Imported here: mindmap_bulk builds on this module
+    from utils import concept_search, mindmap_bulk
+
+    _update_job(job_id, status=STATUS_RUNNING)
+    db = SessionLocal()
+    try:
+        report = mindmap_bulk.generate_for_courses(db, user_id, course_ids=course_ids, force=force)
+        if report["courses_linked"]:
+            concept_search.invalidate()
+        _update_job(job_id, status=STATUS_COMPLETED, result=report, completed_at=datetime.utcnow())
+    except Exception as e:
+        print(f"MindMap Bulk Job {job_id} Error: {e}")
+        db.rollback()
+        _update_job(job_id, status=STATUS_FAILED, error=str(e), completed_at=datetime.utcnow())
+    finally:
+        db.close()
@@ -0,0 +1,137 @@
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+
+# Rows per INSERT
+CHUNK_SIZE = 1000
+
+
+def flatten(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One row per node of a mind-map JSON tree, addressed by its child-index path."""
+    rows = []
+    stack = [(data, "", None, 0)]
+    while stack:
+        node, path, parent_path, depth = stack.pop()
+        children = node.get("children") or []
+        rows.append({
+            "path": path,
+            "parent_path": parent_path,
+            "depth": depth,
+            "name": str(node.get("name", ""))[:255],
+            "link": node.get("link"),
+            "youtube_link": node.get("youtube_link"),
+            "child_count": len(children),
+        })
+        for i, child in enumerate(children):
+            stack.append((child, f"{path}.{i}" if path else str(i), path, depth + 1))
+    return rows
+
+
+def store_nodes(db: Session, maps: Dict[int, Dict[str, Any]]) -> None:
+    """Bulk-inserts node rows for {map_id: data}. The caller commits."""
+    rows = [
+        {"map_id": map_id, **row}
+        for map_id, data in maps.items() if data
+        for row in flatten(data)
+    ]
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.execute(insert(models.MindMapTreeNode), rows[i:i + CHUNK_SIZE])
+
+
+def replace_nodes(db: Session, maps: Dict[int, Dict[str, Any]]) -> None:
+    """Swaps the node rows of existing maps for {map_id: data}. The caller commits."""
+    map_ids = list(maps)
+    for i in range(0, len(map_ids), CHUNK_SIZE):
+        db.execute(delete(models.MindMapTreeNode).where(models.MindMapTreeNode.map_id.in_(map_ids[i:i + CHUNK_SIZE])))
+    store_nodes(db, maps)
+
+
+def _walk(data: Dict[str, Any], path: str) -> Optional[Dict[str, Any]]:
+    node = data
+    for part in filter(None, path.split(".")):
+        children = node.get("children") or []
+        if not part.isdigit() or int(part) >= len(children):
+            return None
+        node = children[int(part)]
+    return node
+
+
+def _from_json(node: Dict[str, Any], path: str, levels: int) -> Dict[str, Any]:
+    children = node.get("children") or []
+    result = {
+        "path": path,
+        "name": node.get("name"),
+        "link": node.get("link"),
+        "youtube_link": node.get("youtube_link"),
+        "child_count": len(children),
+    }
+    if levels > 0:
+        result["children"] = [
+            _from_json(child, f"{path}.{i}" if path else str(i), levels - 1)
+            for i, child in enumerate(children)
+        ]
+    return result
+
+
+def get_subtree(db: Session, map_id: int, path: str = "", levels: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    The node at path with `levels` levels of children, from mindmap_nodes in one query.
+    Maps stored before node rows existed are walked from their JSON once and backfilled.
+    """
+    base = db.query(models.MindMapTreeNode.depth).filter(
+        models.MindMapTreeNode.map_id == map_id, models.MindMapTreeNode.path == path
+    ).first()
+
+    if base is None:
+        has_rows = db.query(models.MindMapTreeNode.id).filter(models.MindMapTreeNode.map_id == map_id).first()
+        if has_rows:
+            return None
+        data = db.query(models.MindMap.data).filter(models.MindMap.id == map_id).scalar()
+        if not data:
+            return None
+        try:
+            store_nodes(db, {map_id: data})
+            db.commit()
+        except IntegrityError:
+            # A concurrent first read backfilled the map first; serve from its rows
+            db.rollback()
+            return get_subtree(db, map_id, path, levels)
+        node = _walk(data, path)
+        return _from_json(node, path, levels) if node is not None else None
+
+    query = db.query(models.MindMapTreeNode).filter(
+        models.MindMapTreeNode.map_id == map_id,
+        models.MindMapTreeNode.depth <= base[0] + levels,
+    )
+    if path:
+        query = query.filter(or_(
+            models.MindMapTreeNode.path == path,
+            models.MindMapTreeNode.path.like(f"{path}.%"),
+        ))
+    rows = query.order_by(models.MindMapTreeNode.depth).all()
+
+    by_path = {}
+    for row in rows:
+        item = {
+            "path": row.path,
+            "name": row.name,
+            "link": row.link,
+            "youtube_link": row.youtube_link,
+            "child_count": row.child_count,
+        }
+        if row.depth < base[0] + levels:
+            item["children"] = []
+        by_path[row.path] = item
+        parent = by_path.get(row.parent_path) if row.path != path else None
+        if parent is not None:
+            parent["children"].append(item)
+
+    # Children come back in insertion order; keep them in index order
+    for item in by_path.values():
+        if "children" in item:
+            item["children"].sort(key=lambda c: int(c["path"].rsplit(".", 1)[-1]))
+    return by_path.get(path)
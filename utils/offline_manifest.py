@@ -0,0 +1,168 @@
+import base64
+import gzip
+import json
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+import models
+
+OP_UPSERT = "UPSERT"
+OP_DELETE = "DELETE"
+
+# Student ids per IN (...) list when logging changes
+CHUNK_SIZE = 1000
+
+
+def _allocation_rows(db: Session, exam_id: int, student_ids: Optional[List[int]] = None, room_id: Optional[int] = None):
+    """(student_id, roll, seat_label, room_id, room_name, student_name) for an exam's allocations."""
+    query = db.query(
+        models.Student.id,
+        models.Student.roll_number,
+        models.RoomSeat.seat_label,
+        models.Room.id,
+        models.Room.name,
+        models.User.name,
+    ).select_from(models.SeatAllocation).join(
+        models.Student, models.SeatAllocation.student_id == models.Student.id
+    ).join(
+        models.RoomSeat, models.SeatAllocation.seat_id == models.RoomSeat.id
+    ).join(
+        models.Room, models.SeatAllocation.room_id == models.Room.id
+    ).outerjoin(
+        models.User, models.Student.user_id == models.User.id
+    ).filter(models.SeatAllocation.exam_id == exam_id)
+
+    if student_ids is not None:
+        query = query.filter(models.Student.id.in_(student_ids))
+    if room_id is not None:
+        query = query.filter(models.SeatAllocation.room_id == room_id)
+    return query.all()
+
+
+def record_allocation_changes(db: Session, exam_id: int, student_ids: Iterable[int]) -> None:
+    """
+    Appends the current allocation state of the given students to the change log:
+    UPSERT with their seat if they are seated for the exam, DELETE otherwise.
+    Call after the allocation change has been committed.
+    """
+    student_ids = list({int(s) for s in student_ids})
+    if not student_ids:
+        return
+
+    rows = []
+    for i in range(0, len(student_ids), CHUNK_SIZE):
+        chunk = student_ids[i:i + CHUNK_SIZE]
+        seated = {r[0]: r for r in _allocation_rows(db, exam_id, student_ids=chunk)}
+        unseated = set(chunk) - set(seated)
+        rolls = dict(db.query(models.Student.id, models.Student.roll_number).filter(
+            models.Student.id.in_(unseated)
+        ).all()) if unseated else {}
+
+        for student_id, roll, seat_label, room_id, room_name, name in seated.values():
+            rows.append({
+                "exam_id": exam_id, "roll_number": roll, "op": OP_UPSERT,
+                "room_id": room_id, "room_name": room_name, "seat_label": seat_label, "student_name": name,
+            })
+        for student_id, roll in rolls.items():
+            rows.append({
+                "exam_id": exam_id, "roll_number": roll, "op": OP_DELETE,
+                "room_id": None, "room_name": None, "seat_label": None, "student_name": None,
+            })
+
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.execute(insert(models.AllocationChange), rows[i:i + CHUNK_SIZE])
+    db.commit()
+
+
+def current_version(db: Session, exam_id: int) -> int:
+    version = db.query(func.max(models.AllocationChange.id)).filter(
+        models.AllocationChange.exam_id == exam_id
+    ).scalar()
+    return version or 0
+
+
+def _record(roll, seat_label, room_name, name) -> List[Any]:
+    # Compact positional record: [roll, seat, room, name]
+    return [roll, seat_label, room_name, name]
+
+
+def build_manifest(db: Session, exam_id: int, room_id: Optional[int] = None, since: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Full snapshot (since is None) or delta since a previous version.
+    Records are sorted by roll so devices can binary-search them.
+    """
+    version = current_version(db, exam_id)
+    manifest = {
+        "exam_id": exam_id,
+        "room_id": room_id,
+        "version": version,
+        "base_version": since,
+        "generated_at": int(time.time()),
+    }
+
+    if since is None:
+        rows = _allocation_rows(db, exam_id, room_id=room_id)
+        manifest["records"] = sorted(
+            (_record(roll, seat, room_name, name) for _, roll, seat, _, room_name, name in rows),
+            key=lambda r: r[0],
+        )
+        manifest["removed"] = []
+        return manifest
+
+    # Delta: replay the log in order, keeping only each roll's latest state
+    changes = db.query(
+        models.AllocationChange.roll_number,
+        models.AllocationChange.op,
+        models.AllocationChange.room_id,
+        models.AllocationChange.room_name,
+        models.AllocationChange.seat_label,
+        models.AllocationChange.student_name,
+    ).filter(
+        models.AllocationChange.exam_id == exam_id,
+        models.AllocationChange.id > since,
+        models.AllocationChange.id <= version,
+    ).order_by(models.AllocationChange.id).all()
+
+    latest = {}
+    for roll, op, change_room_id, room_name, seat, name in changes:
+        latest[roll] = (op, change_room_id, room_name, seat, name)
+
+    upserts, removed = [], []
+    for roll, (op, change_room_id, room_name, seat, name) in latest.items():
+        # A student moved out of this room shows up as a removal for its devices
+        if op == OP_UPSERT and (room_id is None or change_room_id == room_id):
+            upserts.append(_record(roll, seat, room_name, name))
+        else:
+            removed.append(roll)
+
+    manifest["records"] = sorted(upserts, key=lambda r: r[0])
+    manifest["removed"] = sorted(removed)
+    return manifest
+
+
+@lru_cache(maxsize=4)
+def _private_key(signing_key: str) -> Ed25519PrivateKey:
+    return Ed25519PrivateKey.from_private_bytes(base64.b64decode(signing_key))
+
+
+def public_key(signing_key: str) -> str:
+    """Base64 raw Ed25519 public key that scanner devices verify manifests with."""
+    raw = _private_key(signing_key).public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    return base64.b64encode(raw).decode()
+
+
+def encode_manifest(manifest: Dict[str, Any], signing_key: str) -> Tuple[bytes, str]:
+    """
+    Gzip-compressed compact JSON plus a hex Ed25519 signature over the compressed bytes.
+    signing_key is the base64 private key; devices hold only the public half.
+    """
+    raw = json.dumps(manifest, separators=(",", ":")).encode()
+    body = gzip.compress(raw, compresslevel=9, mtime=0)
+    signature = _private_key(signing_key).sign(body).hex()
+    return body, signature
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import config
+
+
+class HasherBusy(Exception):
+    """More hashing work is waiting than PASSWORD_HASH_QUEUE_LIMIT allows."""
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_pending = 0  # running + queued
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "failed": 0,
+    "wait_seconds_total": 0.0,
+    "run_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Dedicated pool for bcrypt/argon2 work. Both release the GIL while hashing, so threads
+    run in parallel; the pool size caps the CPU that logins can take from everything else.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.PASSWORD_HASH_WORKERS), thread_name_prefix="password-hash"
+                )
+    return _executor
+
+
+def _timed(fn: Callable, submitted_at: float, args) -> Any:
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    except Exception:
+        with _lock:
+            _stats["failed"] += 1
+        raise
+    finally:
+        finished = time.perf_counter()
+        wait = started - submitted_at
+        with _lock:
+            _stats["completed"] += 1
+            _stats["wait_seconds_total"] += wait
+            _stats["run_seconds_total"] += finished - started
+            _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], wait)
+
+
+def _release(_future) -> None:
+    # Runs on completion and on cancellation of a still-queued task alike
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+async def run(fn: Callable, *args) -> Any:
+    """
+    Runs fn(*args) on the hasher pool without blocking the event loop.
+    Raises HasherBusy instead of queueing beyond PASSWORD_HASH_QUEUE_LIMIT, so a login
+    storm is shed quickly rather than piling up behind a growing backlog.
+    """
+    global _pending
+    executor = get_executor()
+    with _lock:
+        if _pending >= max(1, config.PASSWORD_HASH_WORKERS) + config.PASSWORD_HASH_QUEUE_LIMIT:
+            _stats["rejected"] += 1
+            raise HasherBusy()
+        _pending += 1
+    try:
+        future = executor.submit(_timed, fn, time.perf_counter(), args)
+    except RuntimeError:
+        # Pool shut down
+        with _lock:
+            _pending -= 1
+        raise
+    future.add_done_callback(_release)
+    return await asyncio.wrap_future(future)
+
+
+def metrics() -> Dict[str, Any]:
+    with _lock:
+        completed = _stats["completed"]
+        workers = max(1, config.PASSWORD_HASH_WORKERS)
+        return {
+            "workers": workers,
+            "queue_limit": config.PASSWORD_HASH_QUEUE_LIMIT,
+            "running": min(_pending, workers),
+            "queued": max(0, _pending - workers),
+            "completed": completed,
+            "failed": _stats["failed"],
+            "rejected": _stats["rejected"],
+            "avg_wait_ms": round(_stats["wait_seconds_total"] / completed * 1000, 2) if completed else 0.0,
+            "max_wait_ms": round(_stats["wait_seconds_max"] * 1000, 2),
+            "avg_run_ms": round(_stats["run_seconds_total"] / completed * 1000, 2) if completed else 0.0,
+        }
@@ -5,18 +5,56 @@ from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 import base64
+import os
+import tempfile
 
-def extract_text_from_pdf(filepath):
+import config
+
+from utils.qr_utils import generate_qr_image_and_payload
+
+def exam_title(course_title, course_name, course_code, title):
+    """Heading for tickets and packs: Course Title > Course Name > Course Code > Exam Title."""
+    title_text = course_title or course_name or course_code or "Exam"
+    if title_text == "Exam" and title:
+        title_text = title
+    return title_text
+
+def _pdf_reader(source):
+    # source is a filesystem path or a binary file object (e.g. an UploadFile's .file)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return PyPDF2.PdfReader(source)
+
+def count_pdf_pages(source):
+    return len(_pdf_reader(source).pages)
+
+def extract_pdf_pages(source, start, stop, max_chars=None):
     """
-    Extracts text from a PDF file using PyPDF2.
+    Extracts pages [start, stop) of a PDF, stopping early once max_chars are collected.
+    Top-level so page chunks can be extracted in parallel inside a process pool.
     """
+    reader = _pdf_reader(source)
+    parts = []
+    total = 0
+    for page in reader.pages[start:stop]:
+        text = page.extract_text() or ""
+        parts.append(text)
+        total += len(text)
+        if max_chars is not None and total >= max_chars:
+            break
+    return "".join(parts)
+
+def extract_text_from_pdf(filepath, max_pages=None, max_chars=None):
+    """
+    Extracts text from a PDF file (path or binary stream) using PyPDF2.
+    Reads at most max_pages pages and returns at most max_chars characters,
+    stopping as soon as either cap is reached (defaults: PDF_MAX_PAGES / PDF_MAX_CHARS).
+    """
+    max_pages = config.PDF_MAX_PAGES if max_pages is None else max_pages
+    max_chars = config.PDF_MAX_CHARS if max_chars is None else max_chars
     try:
-        with open(filepath, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-        return text
+        text = extract_pdf_pages(filepath, 0, max_pages, max_chars)
+        return text[:max_chars]
     except Exception as e:
         print(f"Error reading PDF: {e}")
         return ""
@@ -125,3 +163,142 @@ def generate_hall_ticket_buffer(
     c.save()
     buffer.seek(0)
     return buffer
+
+def save_pdf_atomically(target_path, data):
+    """
+    Writes bytes to a temp file next to target_path and renames it into place,
+    so readers never observe a half-written PDF.
+    """
+    directory = os.path.dirname(target_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def render_hall_ticket_file(target_path, qr_fields, ticket_fields):
+    """
+    Renders a hall ticket (QR + PDF) and saves it to target_path.
+    Top-level so it can run inside a process pool.
+    """
+    qr_base64, _ = generate_qr_image_and_payload(**qr_fields)
+    buffer = generate_hall_ticket_buffer(qr_base64=qr_base64, **ticket_fields)
+    save_pdf_atomically(target_path, buffer.getvalue())
+    return target_path
+
+def _pack_header(c, width, height, heading, room_name, exam_title, exam_date, exam_time):
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width / 2, height - 50, heading)
+    c.setFont("Helvetica", 11)
+    c.drawCentredString(width / 2, height - 68, f"{exam_title} | {exam_date} {exam_time} | Room: {room_name}")
+    return height - 95
+
+def _fit(text, limit):
+    text = str(text or "")
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+def generate_room_pack_buffer(room_name, exam_title, exam_date, exam_time, seats):
+    """
+    Generates an invigilator pack for one room in memory: a grid seating chart,
+    an attendance sheet and a door list.
+    seats: (seat_label, row_number, col_number, roll_number, student_name) for every
+    seat of the room, roll/name None where the seat is empty.
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    header = (room_name, exam_title, exam_date, exam_time)
+    occupied = sorted((s for s in seats if s[3]), key=lambda s: str(s[3]))
+
+    # --- Seating Chart ---
+    top = _pack_header(c, width, height, "SEATING CHART", *header)
+    # Seats without coordinates are laid out after the mapped ones, ten per row
+    spill_row = max([s[1] for s in seats if s[1]] or [0]) + 1
+    placed, spill = [], 0
+    for label, row, col, roll, _ in seats:
+        if not (row and col):
+            row, col = spill_row + spill // 10, spill % 10 + 1
+            spill += 1
+        placed.append((label, row, col, roll))
+    max_row = max([p[1] for p in placed] or [1])
+    max_col = max([p[2] for p in placed] or [1])
+
+    cell_w = (width - 80) / max_col
+    cell_h = min(50, (top - 70) / max_row)
+    font = max(5, min(9, cell_w / 8, cell_h / 4))
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(width / 2, top, "FRONT (Invigilator Desk)")
+    for label, row, col, roll in placed:
+        x = 40 + (col - 1) * cell_w
+        y = top - 15 - row * cell_h
+        if roll:
+            c.setFillColor(colors.lightgrey)
+            c.rect(x + 1, y + 1, cell_w - 2, cell_h - 2, fill=1, stroke=1)
+            c.setFillColor(colors.black)
+        else:
+            c.rect(x + 1, y + 1, cell_w - 2, cell_h - 2, fill=0, stroke=1)
+        c.setFont("Helvetica-Bold", font)
+        c.drawCentredString(x + cell_w / 2, y + cell_h - font - 3, _fit(label, 12))
+        c.setFont("Helvetica", font)
+        c.drawCentredString(x + cell_w / 2, y + 4, _fit(roll or "-", 14))
+    c.setFont("Helvetica", 10)
+    c.drawString(40, 45, f"Seats: {len(seats)} | Allocated: {len(occupied)}")
+    c.showPage()
+
+    # --- Attendance Sheet ---
+    columns = [(40, "S.No"), (80, "Roll Number"), (190, "Name"), (380, "Seat"), (440, "Signature")]
+    row_h = 22
+    y = 0
+    # Seat order, so invigilators can walk the rows while marking
+    for i, (label, _, _, roll, name) in enumerate(s for s in seats if s[3]):
+        if i == 0 or y < 60:
+            if i:
+                c.showPage()
+            y = _pack_header(c, width, height, "ATTENDANCE SHEET", *header)
+            c.setFont("Helvetica-Bold", 10)
+            for x, title in columns:
+                c.drawString(x, y, title)
+            c.line(40, y - 6, width - 40, y - 6)
+            y -= row_h
+            c.setFont("Helvetica", 10)
+        values = [str(i + 1), roll, _fit(name, 32), label, ""]
+        for (x, _), value in zip(columns, values):
+            c.drawString(x, y, str(value or ""))
+        c.line(440, y - 4, width - 40, y - 4)
+        y -= row_h
+    if not occupied:
+        _pack_header(c, width, height, "ATTENDANCE SHEET", *header)
+    c.drawString(40, 40, "Invigilator Signature: ____________________")
+    c.showPage()
+
+    # --- Door List ---
+    y = _pack_header(c, width, height, "DOOR LIST", *header)
+    per_column = int((y - 50) // 20)
+    c.setFont("Helvetica-Bold", 12)
+    for i, (label, _, _, roll, _) in enumerate(occupied):
+        if i and i % (per_column * 2) == 0:
+            c.showPage()
+            y = _pack_header(c, width, height, "DOOR LIST (contd.)", *header)
+            c.setFont("Helvetica-Bold", 12)
+        slot = i % (per_column * 2)
+        x = 60 if slot < per_column else width / 2 + 20
+        c.drawString(x, y - (slot % per_column) * 20, f"{roll}  -  Seat {label}")
+    c.showPage()
+
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+def render_room_pack_file(target_path, pack_fields):
+    """
+    Renders a room's invigilator pack and saves it to target_path.
+    Top-level so it can run inside a process pool.
+    """
+    buffer = generate_room_pack_buffer(**pack_fields)
+    save_pdf_atomically(target_path, buffer.getvalue())
+    return target_path
@@ -1,8 +1,67 @@
 
 import qrcode
 import base64
+import hashlib
+import hmac
+import time
+from datetime import datetime, timedelta
 from io import BytesIO
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+
+def make_ticket_token(student_id, exam_id, seat_label) -> str:
+    """
+    Deterministic per-ticket token: truncated SHA-256 of student id, exam id and seat label.
+    Shared by on-demand downloads, batch dispatch and the verification index.
+    """
+    token_source = f"{student_id}-{exam_id}-{seat_label}"
+    return hashlib.sha256(token_source.encode()).hexdigest()[:10].upper()
+
+def validity_window(start_time: datetime, duration_minutes: int, before_minutes: int, after_minutes: int) -> Tuple[int, int]:
+    """(valid_from, valid_until) as unix timestamps around an exam's sitting."""
+    valid_from = start_time - timedelta(minutes=before_minutes)
+    valid_until = start_time + timedelta(minutes=(duration_minutes or 0) + after_minutes)
+    return int(valid_from.timestamp()), int(valid_until.timestamp())
+
+def _signature(body: str, signing_key: str) -> str:
+    # 128-bit truncated HMAC-SHA256 keeps the QR small while staying unforgeable
+    return hmac.new(signing_key.encode(), body.encode(), hashlib.sha256).hexdigest()[:32].upper()
+
+def sign_qr_payload(raw_payload: str, signing_key: str) -> str:
+    """Appends an HMAC over everything before it: <payload>|SIG:<hex>."""
+    return f"{raw_payload}|SIG:{_signature(raw_payload, signing_key)}"
+
+def parse_qr_payload(raw_payload: str) -> Dict[str, str]:
+    """Splits KEY:VALUE|KEY:VALUE... into a dict (values may contain colons)."""
+    parts = {}
+    for p in raw_payload.strip().split('|'):
+        if ':' in p:
+            key, val = p.split(':', 1)
+            parts[key.strip()] = val.strip()
+    return parts
+
+def check_signed_payload(raw_payload: str, signing_key: str, now: Optional[float] = None) -> Optional[str]:
+    """
+    Verifies a signed payload from its contents alone.
+    Returns None when authentic and inside its VALID window, else the reason it was rejected.
+    """
+    body, sep, sig = raw_payload.strip().rpartition("|SIG:")
+    if not sep:
+        return "Unsigned ticket"
+    if not hmac.compare_digest(sig.strip().upper(), _signature(body, signing_key)):
+        return "Invalid Signature"
+
+    window = parse_qr_payload(body).get('VALID', '')
+    try:
+        valid_from, valid_until = (int(v) for v in window.split('-', 1))
+    except ValueError:
+        return "Invalid validity window"
+
+    now = time.time() if now is None else now
+    if now < valid_from:
+        return "Ticket not yet valid"
+    if now > valid_until:
+        return "Ticket expired"
+    return None
 
 def generate_qr_image_and_payload(
     student_id: str, 
@@ -10,7 +69,10 @@ def generate_qr_image_and_payload(
     seat_id: str, 
     exam_id: str, 
     allocated_room: str,
-    unique_token: str
+    unique_token: str,
+    valid_from: Optional[int] = None,
+    valid_until: Optional[int] = None,
+    signing_key: Optional[str] = None
 ) -> Tuple[str, str]:
     """
     Generates a QR code image (Base64) and the raw payload string.
@@ -22,13 +84,16 @@ def generate_qr_image_and_payload(
         exam_id: Identifier for the exam.
         allocated_room: The room where the student is assigned.
         unique_token: A security token generated by the Backend.
+        valid_from / valid_until: Unix timestamps bounding when the ticket may be scanned.
+        signing_key: When given, the payload carries VALID and an HMAC SIG so
+            scanners can check authenticity without a database lookup.
         
     Returns:
         (base64_image: str, raw_payload: str)
     """
     
     # 1. Assemble the Raw Payload String
-    # Format: ID|ROLL|SEAT|EXAM|ROOM|TOKEN
+    # Format: ID|ROLL|SEAT|EXAM|ROOM|TOKEN[|VALID|SIG]
     raw_payload = (
         f"ID:{student_id}|"
         f"ROLL:{roll_number}|"
@@ -37,6 +102,8 @@ def generate_qr_image_and_payload(
         f"ROOM:{allocated_room}|"
         f"TOKEN:{unique_token}"
     )
+    if signing_key:
+        raw_payload = sign_qr_payload(f"{raw_payload}|VALID:{valid_from or 0}-{valid_until or 0}", signing_key)
     
     # 2. Generate QR Code Image
     qr = qrcode.QRCode(
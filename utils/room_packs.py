@@ -0,0 +1,161 @@
+import asyncio
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+import config
+import models
+from db import SessionLocal
+from utils.offline_manifest import current_version
+from utils.pdf_utils import exam_title, render_room_pack_file
+from utils.ticket_dispatcher import get_executor
+
+# Serialises publishing rendered packs with discarding them
+_publish_lock = threading.Lock()
+
+
+def pack_dir(exam_id: int) -> Path:
+    return Path(config.HALL_TICKET_STORAGE_DIR) / str(exam_id) / "room_packs"
+
+
+def pack_path(exam_id: int, room_id: int) -> Path:
+    return pack_dir(exam_id) / f"room_{room_id}.pdf"
+
+
+def discard(exam_id: int) -> None:
+    """Drops an exam's stored packs after its seating changes."""
+    with _publish_lock:
+        shutil.rmtree(pack_dir(exam_id), ignore_errors=True)
+
+
+def _publish(exam_id: int, rendered: Dict[int, str], seating_version: int) -> bool:
+    """
+    Moves staged packs into place, unless the exam's seating changed (its allocation
+    change log moved past seating_version) while they were rendering.
+    """
+    with _publish_lock:
+        db = SessionLocal()
+        try:
+            if current_version(db, exam_id) != seating_version:
+                return False
+        finally:
+            db.close()
+        target_dir = pack_dir(exam_id)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for room_id, staged in rendered.items():
+            os.replace(staged, pack_path(exam_id, room_id))
+        return True
+
+
+def load_room_groups(db: Session, exam_id: int, room_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """
+    Every seat of every room used by the exam, with its occupant if any, in one query.
+    Returns room_id -> {"room_name", "seats": [(label, row, col, roll, name)]}.
+    """
+    used_rooms = db.query(models.SeatAllocation.room_id).filter(
+        models.SeatAllocation.exam_id == exam_id
+    ).distinct()
+    if room_ids is not None:
+        used_rooms = used_rooms.filter(models.SeatAllocation.room_id.in_(room_ids))
+
+    rows = db.query(
+        models.Room.id,
+        models.Room.name,
+        models.RoomSeat.seat_label,
+        models.RoomSeat.row_number,
+        models.RoomSeat.col_number,
+        models.Student.roll_number,
+        models.User.name,
+    ).select_from(models.RoomSeat).join(
+        models.Room, models.RoomSeat.room_id == models.Room.id
+    ).outerjoin(
+        models.SeatAllocation, and_(
+            models.SeatAllocation.seat_id == models.RoomSeat.id,
+            models.SeatAllocation.exam_id == exam_id,
+        )
+    ).outerjoin(
+        models.Student, models.SeatAllocation.student_id == models.Student.id
+    ).outerjoin(
+        models.User, models.Student.user_id == models.User.id
+    ).filter(
+        models.RoomSeat.room_id.in_(used_rooms.scalar_subquery())
+    ).order_by(
+        models.Room.id, models.RoomSeat.row_number, models.RoomSeat.col_number, models.RoomSeat.id
+    ).all()
+
+    groups = {}
+    for room_id, room_name, label, row, col, roll, name in rows:
+        group = groups.setdefault(room_id, {"room_name": room_name, "seats": []})
+        group["seats"].append((label, row, col, roll, name))
+    return groups
+
+
+def _exam_header(db: Session, exam_id: int) -> Dict[str, str]:
+    exam = db.query(
+        models.Exams.title, models.Exams.exam_date, models.Exams.start_time,
+        models.Course.title, models.Course.name, models.Course.code
+    ).outerjoin(models.Course, models.Exams.course_id == models.Course.id
+    ).filter(models.Exams.id == exam_id).first()
+    if not exam:
+        return {"exam_title": "Exam", "exam_date": "-", "exam_time": "-"}
+
+    title, e_date, e_start, c_title, c_name, c_code = exam
+    return {
+        "exam_title": exam_title(c_title, c_name, c_code, title),
+        "exam_date": e_date.strftime("%Y-%m-%d") if e_date else "-",
+        "exam_time": e_start.strftime("%I:%M %p") if e_start else "-",
+    }
+
+
+async def render_room_packs(db: Session, exam_id: int, room_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+    """
+    Renders one pack per room on the shared rendering pool, all rooms at once, into a
+    staging directory; the packs replace the stored ones only if seating did not change meanwhile.
+    Returns room_id -> {"room_name", "seats", "allocated", "path" or "error"}.
+    """
+    seating_version = await asyncio.to_thread(current_version, db, exam_id)
+    groups = await asyncio.to_thread(load_room_groups, db, exam_id, room_ids)
+    header = await asyncio.to_thread(_exam_header, db, exam_id)
+
+    staging = pack_dir(exam_id).parent / f".room_packs-{uuid.uuid4().hex}"
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        jobs = [
+            (room_id, loop.run_in_executor(
+                executor, render_room_pack_file, str(staging / f"room_{room_id}.pdf"),
+                {"room_name": group["room_name"], "seats": group["seats"], **header},
+            ))
+            for room_id, group in groups.items()
+        ]
+        outcomes = await asyncio.gather(*(job for _, job in jobs), return_exceptions=True)
+        rendered = {
+            room_id: outcome for (room_id, _), outcome in zip(jobs, outcomes)
+            if not isinstance(outcome, BaseException)
+        }
+        published = await asyncio.to_thread(_publish, exam_id, rendered, seating_version) if rendered else True
+    finally:
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+
+    report = {}
+    for (room_id, _), outcome in zip(jobs, outcomes):
+        group = groups[room_id]
+        entry = {
+            "room_name": group["room_name"],
+            "seats": len(group["seats"]),
+            "allocated": sum(1 for s in group["seats"] if s[3]),
+        }
+        if isinstance(outcome, BaseException):
+            entry["error"] = f"Rendering Failed: {outcome}"
+        elif not published:
+            entry["error"] = "Seating changed while rendering; generate the packs again"
+        else:
+            entry["path"] = str(pack_path(exam_id, room_id))
+        report[room_id] = entry
+    return report
@@ -0,0 +1,424 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+import models
+from db import SessionLocal
+from utils import dispatch_store
+from utils.pdf_utils import exam_title as format_exam_title, render_hall_ticket_file
+from utils.qr_utils import make_ticket_token, validity_window
+
+REQUIRED_FIELDS = ['student_id', 'roll', 'seat_id', 'room_id', 'exam_id']
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# PRERENDER batches this process is rendering, so a resume never runs one twice here
+_active_prerenders = set()
+_prerender_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Shared rendering pool. Its size is the global cap on tickets rendered at once,
+    however many batches are running. 'spawn' avoids forking DB connections.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, config.DISPATCH_CONCURRENCY),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _load_work(batch_id: str, status: str) -> List[Tuple[int, Dict[str, Any]]]:
+    db = SessionLocal()
+    try:
+        return dispatch_store.get_work_items(db, batch_id, status=status)
+    finally:
+        db.close()
+
+
+def _record(results: List[Tuple[int, str, Optional[str]]]) -> None:
+    db = SessionLocal()
+    try:
+        dispatch_store.record_results(db, results)
+    finally:
+        db.close()
+
+
+def _current_seats(assignments: List[Dict[str, Any]]) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """Live (seat_id, room_id) per (exam_id, student_id) for a chunk of assignments."""
+    exam_ids = {i for i in (_as_int(a.get('exam_id')) for a in assignments) if i is not None}
+    student_ids = {i for i in (_as_int(a.get('student_id')) for a in assignments) if i is not None}
+    if not exam_ids or not student_ids:
+        return {}
+
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            models.SeatAllocation.exam_id, models.SeatAllocation.student_id,
+            models.SeatAllocation.seat_id, models.SeatAllocation.room_id,
+        ).filter(
+            models.SeatAllocation.exam_id.in_(exam_ids),
+            models.SeatAllocation.student_id.in_(student_ids),
+        ).all()
+    finally:
+        db.close()
+    return {(exam_id, student_id): (seat_id, room_id) for exam_id, student_id, seat_id, room_id in rows}
+
+
+def _seat_key(assignment: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    return _as_int(assignment.get('exam_id')), _as_int(assignment.get('student_id'))
+
+
+def _resolve_contexts(assignments: List[Dict[str, Any]]) -> Dict[str, Dict]:
+    """
+    Resolves names, rooms, seats and exam details for a chunk of assignments
+    with one column-only IN query per table.
+    """
+    student_ids = {i for i in (_as_int(a.get('student_id')) for a in assignments) if i is not None}
+    exam_ids = {i for i in (_as_int(a.get('exam_id')) for a in assignments) if i is not None}
+    room_ids = {i for i in (_as_int(a.get('room_id')) for a in assignments) if i is not None}
+    seat_ids = {i for i in (_as_int(a.get('seat_id')) for a in assignments) if i is not None}
+
+    db = SessionLocal()
+    try:
+        students = {}
+        if student_ids:
+            rows = db.query(
+                models.Student.id, models.User.name, models.User.email, models.Program.name
+            ).outerjoin(models.User, models.Student.user_id == models.User.id
+            ).outerjoin(models.Branch, models.Student.branch_id == models.Branch.id
+            ).outerjoin(models.Program, models.Branch.program_id == models.Program.id
+            ).filter(models.Student.id.in_(student_ids)).all()
+            students = {r[0]: r for r in rows}
+
+        exams = {}
+        if exam_ids:
+            rows = db.query(
+                models.Exams.id, models.Exams.title, models.Exams.exam_type,
+                models.Exams.exam_date, models.Exams.start_time, models.Exams.duration_minutes,
+                models.Course.title, models.Course.name, models.Course.code
+            ).outerjoin(models.Course, models.Exams.course_id == models.Course.id
+            ).filter(models.Exams.id.in_(exam_ids)).all()
+            exams = {r[0]: r for r in rows}
+
+        rooms = {}
+        if room_ids:
+            rooms = dict(db.query(models.Room.id, models.Room.name).filter(models.Room.id.in_(room_ids)).all())
+
+        seats = {}
+        if seat_ids:
+            seats = dict(db.query(models.RoomSeat.id, models.RoomSeat.seat_label).filter(models.RoomSeat.id.in_(seat_ids)).all())
+    finally:
+        db.close()
+
+    return {"students": students, "exams": exams, "rooms": rooms, "seats": seats}
+
+
+def _build_render_args(assignment: Dict[str, Any], ctx: Dict[str, Dict]) -> Tuple[Dict, Dict]:
+    """Builds (qr_fields, ticket_fields) for one assignment, falling back to the raw values sent."""
+    student_id = assignment['student_id']
+    roll_no = str(assignment['roll'])
+
+    student = ctx["students"].get(_as_int(student_id))
+    exam = ctx["exams"].get(_as_int(assignment['exam_id']))
+    room_name = ctx["rooms"].get(_as_int(assignment['room_id']), str(assignment['room_id']))
+    seat_label = ctx["seats"].get(_as_int(assignment['seat_id']), str(assignment['seat_id']))
+
+    student_name = assignment.get('name') or roll_no
+    program_name = "Academix Program"
+    if student:
+        _, name, email, program = student
+        student_name = name or (email.split('@')[0] if email else student_name)
+        program_name = program or program_name
+
+    exam_title, exam_date, exam_time, exam_type = "Exam", "-", "-", "SEMESTER"
+    valid_from = valid_until = None
+    if exam:
+        _, title, e_type, e_date, e_start, e_duration, c_title, c_name, c_code = exam
+        exam_title = format_exam_title(c_title, c_name, c_code, title)
+        exam_date = e_date.strftime("%Y-%m-%d") if e_date else exam_date
+        exam_time = e_start.strftime("%I:%M %p") if e_start else exam_time
+        exam_type = e_type or exam_type
+        if e_start:
+            valid_from, valid_until = validity_window(
+                e_start, e_duration, config.QR_VALID_BEFORE_MINUTES, config.QR_VALID_AFTER_MINUTES
+            )
+
+    qr_fields = {
+        "student_id": roll_no,
+        "roll_number": roll_no,
+        "seat_id": seat_label,
+        "exam_id": str(assignment['exam_id']),
+        "allocated_room": room_name,
+        "unique_token": make_ticket_token(student_id, assignment['exam_id'], seat_label),
+        "valid_from": valid_from,
+        "valid_until": valid_until,
+        # Without a known exam time there is no window to sign
+        "signing_key": config.QR_SIGNING_KEY if valid_from else None,
+    }
+    ticket_fields = {
+        "student_name": student_name,
+        "roll_number": roll_no,
+        "course_name": program_name,
+        "exam_title": exam_title,
+        "exam_date": exam_date,
+        "exam_time": exam_time,
+        "room_name": room_name,
+        "seat_name": seat_label,
+        "exam_type": exam_type,
+    }
+    return qr_fields, ticket_fields
+
+
+def prerender_dir(exam_id: int) -> Path:
+    """
+    Release-time tickets: <storage>/<exam_id>/prerendered/<roll>.pdf, apart from the
+    admin-uploaded <storage>/<exam_id>/<roll>.pdf so seat changes never touch uploads.
+    """
+    return Path(config.HALL_TICKET_STORAGE_DIR) / str(exam_id) / "prerendered"
+
+
+def prerender_target(exam_id: int) -> Callable[[Dict[str, Any]], Path]:
+    exam_dir = prerender_dir(exam_id)
+
+    def target_for(assignment: Dict[str, Any]) -> Path:
+        return exam_dir / f"{assignment['roll']}.pdf"
+    return target_for
+
+
+def discard_prerendered(exam_id: int, roll_numbers: List[str]) -> None:
+    """Drops pre-rendered tickets whose seat has changed, so downloads fall back to on-demand rendering."""
+    exam_dir = prerender_dir(exam_id)
+    for roll in roll_numbers:
+        (exam_dir / f"{roll}.pdf").unlink(missing_ok=True)
+
+
+def create_prerender_batch(db, exam_id: int) -> Tuple[str, int]:
+    """Queues every allocation of an exam as a PRERENDER dispatch batch. Returns (batch_id, count)."""
+    rows = db.query(
+        models.SeatAllocation.student_id,
+        models.Student.roll_number,
+        models.Branch.name,
+        models.SeatAllocation.seat_id,
+        models.SeatAllocation.room_id,
+    ).join(
+        models.Student, models.SeatAllocation.student_id == models.Student.id
+    ).outerjoin(
+        models.Branch, models.Student.branch_id == models.Branch.id
+    ).filter(models.SeatAllocation.exam_id == exam_id).all()
+
+    items = [
+        {
+            "roll_number": roll,
+            "branch": branch,
+            "payload": {
+                "student_id": student_id, "roll": roll, "branch": branch,
+                "seat_id": seat_id, "room_id": room_id, "exam_id": exam_id,
+            },
+        }
+        for student_id, roll, branch, seat_id, room_id in rows
+    ]
+    batch_id = dispatch_store.new_batch_id("PRERENDER")
+    dispatch_store.create_batch(db, batch_id, items, kind="PRERENDER", exam_id=exam_id)
+    return batch_id, len(items)
+
+
+def latest_prerender_batch(db, exam_id: int) -> Optional[models.DispatchBatch]:
+    return db.query(models.DispatchBatch).filter(
+        models.DispatchBatch.exam_id == exam_id,
+        models.DispatchBatch.kind == "PRERENDER",
+    ).order_by(models.DispatchBatch.created_at.desc()).first()
+
+
+def mark_released(db, exam: models.Exams) -> None:
+    """Makes an exam's hall tickets visible and warms the verification index."""
+    # Imported here: verification_index is only needed once a release goes live
+    from utils import verification_index
+
+    exam.status = "HALL_TICKETS_RELEASED"
+    db.commit()
+    verification_index.refresh(db, exam.id)
+
+
+def claim_prerender(batch_id: str) -> bool:
+    """Reserves a batch for run_prerender in this process; False if it is already running here."""
+    with _prerender_lock:
+        if batch_id in _active_prerenders:
+            return False
+        _active_prerenders.add(batch_id)
+        return True
+
+
+def claim_stalled_prerender(db, batch_id: str) -> bool:
+    """
+    Claims a release batch that still has PENDING or FAILED rows but has made no progress
+    for PRERENDER_STALL_SECONDS: its worker died, or too many renders failed to release.
+    """
+    counts = dispatch_store.get_status_counts(db, batch_id)
+    if not counts.get(dispatch_store.STATUS_PENDING) and not counts.get(dispatch_store.STATUS_FAILED):
+        return False
+    idle = dispatch_store.seconds_since_update(db, batch_id)
+    if idle is not None and idle < config.PRERENDER_STALL_SECONDS:
+        return False
+    return claim_prerender(batch_id)
+
+
+async def run_prerender(exam_id: int, batch_id: str, retry_failed: bool = False) -> None:
+    """
+    Renders a claimed release batch's PENDING rows (then its FAILED rows when retry_failed),
+    re-checking the release threshold after every progress write.
+    """
+    target_for = prerender_target(exam_id)
+    on_progress = functools.partial(release_if_ready, exam_id, batch_id)
+    try:
+        await run_dispatch(batch_id, target_for, on_progress=on_progress, live_seats=True)
+        if retry_failed:
+            await run_dispatch(
+                batch_id, target_for, status=dispatch_store.STATUS_FAILED, is_retry=True,
+                on_progress=on_progress, live_seats=True,
+            )
+    finally:
+        with _prerender_lock:
+            _active_prerenders.discard(batch_id)
+
+
+def release_if_ready(exam_id: int, batch_id: str) -> bool:
+    """
+    Flips an exam from HALL_TICKETS_RENDERING to HALL_TICKETS_RELEASED once the
+    batch's rendered share reaches PRERENDER_RELEASE_THRESHOLD.
+    """
+    db = SessionLocal()
+    try:
+        batch = dispatch_store.get_batch(db, batch_id)
+        counts = dispatch_store.get_status_counts(db, batch_id)
+        done = counts.get(dispatch_store.STATUS_SUCCESS, 0)
+        if not batch or not batch.total_requested or done / batch.total_requested < config.PRERENDER_RELEASE_THRESHOLD:
+            return False
+
+        exam = db.query(models.Exams).filter(models.Exams.id == exam_id).first()
+        if not exam or exam.status != "HALL_TICKETS_RENDERING":
+            return False
+        mark_released(db, exam)
+        return True
+    finally:
+        db.close()
+
+
+async def run_dispatch(
+    batch_id: str,
+    target_for: Callable[[Dict[str, Any]], Path],
+    status: str = dispatch_store.STATUS_PENDING,
+    is_retry: bool = False,
+    on_progress: Optional[Callable[[], Any]] = None,
+    live_seats: bool = False,
+) -> None:
+    """
+    Renders every row of a batch in the given status.
+    Rendering runs in the process pool, DB work in threads, and results are
+    written back once per DISPATCH_PROGRESS_BATCH tickets, so the event loop
+    stays free for other requests. on_progress runs in a thread after each write.
+    With live_seats, each row is rendered from the student's current SeatAllocation
+    rather than the seat queued in its payload, and a ticket whose seat moved while
+    it rendered is deleted and failed.
+    """
+    work = await asyncio.to_thread(_load_work, batch_id, status)
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    chunk_size = max(1, config.DISPATCH_PROGRESS_BATCH)
+
+    for i in range(0, len(work), chunk_size):
+        chunk = work[i:i + chunk_size]
+        results = []
+        jobs = []
+
+        valid = []
+        for item_id, assignment in chunk:
+            missing = [f for f in REQUIRED_FIELDS if not assignment.get(f)]
+            if missing:
+                results.append((item_id, f"Data Missing: {', '.join(missing)}"))
+            else:
+                valid.append((item_id, assignment))
+
+        if valid and live_seats:
+            try:
+                current = await asyncio.to_thread(_current_seats, [a for _, a in valid])
+            except Exception as e:
+                current = None
+                results.extend((item_id, f"Lookup Failed: {e}") for item_id, _ in valid)
+                valid = []
+
+            if current is not None:
+                refreshed = []
+                for item_id, assignment in valid:
+                    seat = current.get(_seat_key(assignment))
+                    if seat is None:
+                        results.append((item_id, "Seat Not Allocated"))
+                    else:
+                        refreshed.append((item_id, {**assignment, 'seat_id': seat[0], 'room_id': seat[1]}))
+                valid = refreshed
+
+        if valid:
+            try:
+                ctx = await asyncio.to_thread(_resolve_contexts, [a for _, a in valid])
+            except Exception as e:
+                ctx = None
+                results.extend((item_id, f"Lookup Failed: {e}") for item_id, _ in valid)
+
+            if ctx is not None:
+                for item_id, assignment in valid:
+                    qr_fields, ticket_fields = _build_render_args(assignment, ctx)
+                    target = str(target_for(assignment))
+                    jobs.append((item_id, assignment, target, loop.run_in_executor(
+                        executor, render_hall_ticket_file, target, qr_fields, ticket_fields
+                    )))
+
+        outcomes = await asyncio.gather(*(job for *_, job in jobs), return_exceptions=True)
+        rendered = []
+        for (item_id, assignment, target, _), outcome in zip(jobs, outcomes):
+            if isinstance(outcome, BaseException):
+                results.append((item_id, f"Rendering Failed: {outcome}"))
+            else:
+                rendered.append((item_id, assignment, target))
+
+        if rendered and live_seats:
+            # A reallocation during the render already discarded the old file; don't leave ours behind
+            try:
+                current = await asyncio.to_thread(_current_seats, [a for _, a, _ in rendered])
+            except Exception:
+                current = None
+            if current is not None:
+                still_valid = []
+                for item_id, assignment, target in rendered:
+                    seat = current.get(_seat_key(assignment))
+                    if seat != (_as_int(assignment['seat_id']), _as_int(assignment['room_id'])):
+                        Path(target).unlink(missing_ok=True)
+                        results.append((item_id, "Seat Changed While Rendering"))
+                    else:
+                        still_valid.append((item_id, assignment, target))
+                rendered = still_valid
+        results.extend((item_id, None) for item_id, _, _ in rendered)
+
+        updates = []
+        for item_id, error in results:
+            if error is None:
+                updates.append((item_id, dispatch_store.STATUS_SUCCESS, None))
+            else:
+                updates.append((item_id, dispatch_store.STATUS_FAILED, f"Retry Failed: {error}" if is_retry else error))
+        await asyncio.to_thread(_record, updates)
+        if on_progress:
+            await asyncio.to_thread(on_progress)
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+import config
+import models
+from utils.qr_utils import make_ticket_token
+
+
+class VerificationEntry(NamedTuple):
+    student_id: int
+    seat_label: str
+    room_id: int
+    room_name: str
+    name: Optional[str]
+    token: str
+
+
+# exam_id -> (loaded_at, {roll_number: VerificationEntry})
+_indexes: Dict[int, Tuple[float, Dict[str, VerificationEntry]]] = {}
+_indexes_lock = threading.Lock()
+# One loader per exam, so a burst of scans at exam start triggers a single query
+_load_locks: Dict[int, threading.Lock] = {}
+
+
+def _load_lock(exam_id: int) -> threading.Lock:
+    with _indexes_lock:
+        return _load_locks.setdefault(exam_id, threading.Lock())
+
+
+def _evict_expired(ttl: float) -> None:
+    """Drops expired indexes and the load locks of exams no longer indexed, so neither grows per exam forever."""
+    now = time.monotonic()
+    with _indexes_lock:
+        for exam_id in [e for e, (loaded_at, _) in _indexes.items() if now - loaded_at >= ttl]:
+            del _indexes[exam_id]
+        for exam_id in [e for e, lock in _load_locks.items() if e not in _indexes and not lock.locked()]:
+            del _load_locks[exam_id]
+
+
+def build_exam_index(db: Session, exam_id: int) -> Dict[str, VerificationEntry]:
+    """Loads roll -> (seat, room, name, token) for every allocation of an exam in one joined query."""
+    rows = db.query(
+        models.Student.id,
+        models.Student.roll_number,
+        models.RoomSeat.seat_label,
+        models.Room.id,
+        models.Room.name,
+        models.User.name,
+    ).select_from(models.SeatAllocation).join(
+        models.Student, models.SeatAllocation.student_id == models.Student.id
+    ).join(
+        models.RoomSeat, models.SeatAllocation.seat_id == models.RoomSeat.id
+    ).join(
+        models.Room, models.SeatAllocation.room_id == models.Room.id
+    ).outerjoin(
+        models.User, models.Student.user_id == models.User.id
+    ).filter(models.SeatAllocation.exam_id == exam_id).all()
+
+    return {
+        roll: VerificationEntry(
+            student_id=student_id,
+            seat_label=seat_label,
+            room_id=room_id,
+            room_name=room_name,
+            name=name,
+            token=make_ticket_token(student_id, exam_id, seat_label),
+        )
+        for student_id, roll, seat_label, room_id, room_name, name in rows
+    }
+
+
+def refresh(db: Session, exam_id: int) -> Dict[str, VerificationEntry]:
+    """(Re)builds and installs the index for an exam."""
+    index = build_exam_index(db, exam_id)
+    with _indexes_lock:
+        _indexes[exam_id] = (time.monotonic(), index)
+    return index
+
+
+def refresh_if_loaded(db: Session, exam_id: int) -> None:
+    """Called after allocation changes: rebuilds the exam's index only if this worker holds one."""
+    with _indexes_lock:
+        loaded = exam_id in _indexes
+    if loaded:
+        refresh(db, exam_id)
+
+
+def invalidate(exam_id: int) -> None:
+    with _indexes_lock:
+        _indexes.pop(exam_id, None)
+        lock = _load_locks.get(exam_id)
+        if lock is not None and not lock.locked():
+            del _load_locks[exam_id]
+
+
+def get_exam_index(db: Session, exam_id: int) -> Dict[str, VerificationEntry]:
+    """
+    Returns the exam's index, loading it on first use or once it is older than
+    VERIFICATION_INDEX_TTL_SECONDS (bounds staleness across uvicorn workers).
+    """
+    ttl = config.VERIFICATION_INDEX_TTL_SECONDS
+    cached = _indexes.get(exam_id)
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+
+    _evict_expired(ttl)
+    with _load_lock(exam_id):
+        # Another scan may have loaded it while we waited
+        cached = _indexes.get(exam_id)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        return refresh(db, exam_id)
+
+
+def lookup(db: Session, exam_id: int, roll_number: str) -> Optional[VerificationEntry]:
+    return get_exam_index(db, exam_id).get(roll_number)